@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'project.middleware.PerformanceMiddleware',
+    'project.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -79,13 +81,51 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuning profile (SQLITE_TUNING=True): WAL journal, fsync only at
+# checkpoints, wait for locks instead of failing, memory-mapped reads and
+# bigger page cache; write transactions take the lock on BEGIN
+SQLITE_TUNING = os.getenv('SQLITE_TUNING') == 'True'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 20000))
+SQLITE_TUNED_OPTIONS = {
+    'init_command': ';'.join([
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}',
+        f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+        # negative value is size in KiB
+        f"PRAGMA cache_size=-{int(os.getenv('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+        'PRAGMA temp_store=MEMORY',
+    ]),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db' / 'db.sqlite3',
+        'OPTIONS': SQLITE_TUNED_OPTIONS if SQLITE_TUNING else {},
+        # persistent connections: seconds to keep, 0 - close after request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS') == 'True',
     }
 }
 
+# Read replica (DATABASE_REPLICA_NAME): safe requests read from it.
+# The alias is always defined, reads are routed to it only with
+# READ_REPLICA. Test runs (any runner) get an empty replica database
+# of their own (nothing is replicated to it), routing tests enable
+# READ_REPLICA
+READ_REPLICA = bool(os.getenv('DATABASE_REPLICA_NAME'))
+DATABASES['replica'] = {
+    **DATABASES['default'],
+    'NAME': os.getenv('DATABASE_REPLICA_NAME')
+            or BASE_DIR / 'db' / 'replica.sqlite3',
+}
+DATABASE_ROUTERS = ['project.dbrouters.PrimaryReplicaRouter']
+# after a write client reads from primary for this time (replica lag)
+REPLICA_LAG_TOLERANCE_SEC = int(os.getenv('REPLICA_LAG_TOLERANCE_SEC', 5))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,7 +176,7 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'project.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
 
@@ -169,6 +209,10 @@ SWAGGER_SETTINGS = {
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')  # ex /app/media
+# Uploads are streamed to a temporary file, never kept in memory
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
 
 # Email settings
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -187,5 +231,31 @@ CACHES = {
     }
 }
 
+# Performance instrumentation (project.middleware.PerformanceMiddleware)
+# requests slower than this are logged with their SQL
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', 500))
+# every request logged and its timings sent in Server-Timing header
+# (internal details, off in production by default)
+PERF_VERBOSE = os.getenv('PERF_VERBOSE', str(DEBUG)) == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'project.perf': {
+            'handlers': ['console'],
+            'level': os.getenv(
+                'PERF_LOG_LEVEL', 'INFO' if PERF_VERBOSE else 'WARNING'
+            ),
+            'propagate': False,
+        },
+    },
+}
+
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
@@ -1,6 +1,17 @@
 from django.contrib import admin
-from project.models import Collect, Payment
+from project.models import (
+    Collect,
+    CollectCounterShard,
+    CollectDailyStats,
+    CollectParticipant,
+    OutboxEmail,
+    Payment,
+)
 
 # Register your models here.
 admin.site.register(Collect)
-admin.site.register(Payment)
\ No newline at end of file
+admin.site.register(Payment)
+admin.site.register(CollectParticipant)
+admin.site.register(CollectDailyStats)
+admin.site.register(CollectCounterShard)
+admin.site.register(OutboxEmail)
\ No newline at end of file
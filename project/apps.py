@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ProjectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'project'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from project import perf
+
+        connection_created.connect(perf.install_query_recorder)
@@ -0,0 +1,165 @@
+"""
+Async read views: collect list, detail and feed, payment list.
+Same querysets, serializers, permissions and caches as the viewsets
+(project.views), but DB and cache calls are awaited: under ASGI server
+(`core.asgi`) one worker serves other requests while these wait.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from django.views import View
+from rest_framework.response import Response
+
+from project.cache import (
+    COLLECT_LIST_NAMESPACE,
+    PAYMENT_LIST_NAMESPACE,
+    acache_get,
+    acache_set,
+    aget_collect_version,
+    aget_feed_token,
+    aget_query_cache_key,
+    aread_feed_cache,
+    awrite_feed_cache,
+    )
+from project.dbrouters import pin_primary
+from project.pagination import PaymentCursorPagination
+from project.serializers import PaymentSerializer
+from project.views import CollectViewSet, PaymentViewSet
+
+
+class AsyncReadView(View):
+    """
+    Async GET endpoint driven by a viewset instance: request parsing,
+    authentication, permissions, exception handling and rendering are
+    the viewset ones, `read` is awaited instead of the viewset action.
+    """
+    viewset_class = None
+    # viewset action: sets up querysets and serializers of the viewset
+    action = None
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.viewset_class(action_map={'get': self.action})
+        viewset.args = args
+        viewset.kwargs = kwargs
+        request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.request = request
+        viewset.headers = viewset.default_response_headers
+        try:
+            # authentication may read user from DB
+            await sync_to_async(viewset.initial)(request, *args, **kwargs)
+            response = await self.read(viewset, request, *args, **kwargs)
+        except Exception as exc:
+            response = viewset.handle_exception(exc)
+        return viewset.finalize_response(request, response, *args, **kwargs)
+
+    async def read(self, viewset, request, *args, **kwargs):
+        raise NotImplementedError
+
+    @staticmethod
+    async def aget_object(viewset):
+        """
+        Async `get_object` of the viewset: 404 and object permissions.
+        """
+        queryset = viewset.filter_queryset(viewset.get_queryset())
+        lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
+        obj = await aget_object_or_404(
+            queryset,
+            **{viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]}
+        )
+        viewset.check_object_permissions(viewset.request, obj)
+        return obj
+
+
+class AsyncCachedListView(AsyncReadView):
+    """
+    Paginated list cached by query params, as the viewsets `list`.
+    """
+    action = 'list'
+    # list cache namespace
+    namespace = None
+
+    async def read(self, viewset, request):
+        cache_key = await aget_query_cache_key(self.namespace, request)
+        cached_data = await acache_get(cache_key)
+        if cached_data is not None:
+            return Response(cached_data)
+        # lagging replica must not get into cache
+        with pin_primary():
+            queryset = viewset.filter_queryset(viewset.get_queryset())
+            page = await viewset.paginator.apaginate_queryset(
+                queryset, request, view=viewset
+            )
+        serializer = viewset.get_serializer(page, many=True)
+        response = viewset.get_paginated_response(serializer.data)
+        await acache_set(cache_key, response.data)
+        return response
+
+
+class CollectListView(AsyncCachedListView):
+    viewset_class = CollectViewSet
+    namespace = COLLECT_LIST_NAMESPACE
+
+
+class PaymentListView(AsyncCachedListView):
+    viewset_class = PaymentViewSet
+    namespace = PAYMENT_LIST_NAMESPACE
+
+
+class CollectDetailView(AsyncReadView):
+    """
+    Collect detail with conditional GET support.
+    """
+    viewset_class = CollectViewSet
+    action = 'retrieve'
+
+    async def read(self, viewset, request, pk):
+        # version is read once, before the data read from primary
+        # (see CollectViewSet.conditional)
+        validators = await aget_collect_version(pk)
+        response = viewset.not_modified('collect', pk, request, validators)
+        if response is not None:
+            return response
+        with pin_primary():
+            collect = await self.aget_object(viewset)
+        response = Response(viewset.get_serializer(collect).data)
+        viewset.set_validators('collect', pk, response, validators)
+        return response
+
+
+class CollectFeedView(AsyncReadView):
+    """
+    Payment feed with conditional GET support: recent payments from
+    feed cache, older ones from DB.
+    """
+    viewset_class = CollectViewSet
+    action = 'payments_feed'
+
+    async def read(self, viewset, request, pk):
+        # version is read once, before the data read from primary
+        # (see CollectViewSet.conditional)
+        validators = await aget_collect_version(pk)
+        response = viewset.not_modified('feed', pk, request, validators)
+        if response is not None:
+            return response
+        paginator = PaymentCursorPagination()
+        with pin_primary():
+            collect = await self.aget_object(viewset)
+            cached = await aread_feed_cache(collect.id)
+            if cached is None:
+                token = await aget_feed_token(collect.id)
+                recent = [
+                    payment
+                    async for payment in viewset.get_feed_recent(collect)
+                ]
+                payments = PaymentSerializer(recent, many=True).data
+                cached = viewset.get_feed_cache_entry(payments)
+                await awrite_feed_cache(collect.id, *cached, token)
+            page = paginator.paginate_cached(*cached, request)
+            if page is None:
+                payments = await paginator.apaginate_queryset(
+                    collect.payments.select_related('user'), request,
+                    view=viewset
+                )
+                page = PaymentSerializer(payments, many=True).data
+        response = paginator.get_paginated_response(page)
+        viewset.set_validators('feed', pk, response, validators)
+        return response
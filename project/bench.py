@@ -0,0 +1,125 @@
+"""
+Helpers for benchmark management commands.
+"""
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connections
+
+
+@contextmanager
+def temporary_database(options=None):
+    """
+    Run block against a throwaway copy of the default database
+    (migrated, empty), so benchmarks never touch real data.
+    SQLite copy is a file, not in-memory db: threads need their own
+    connections to it. `options` replace database OPTIONS for the block.
+    """
+    connection = connections['default']
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST']['NAME']
+    old_options = connection.settings_dict['OPTIONS']
+    if options is not None:
+        connection.close()
+        connection.settings_dict['OPTIONS'] = options
+    tmp_dir = tempfile.mkdtemp(prefix='bench_')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict['TEST']['NAME'] = os.path.join(
+            tmp_dir, 'bench.sqlite3'
+        )
+    connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+        connection.settings_dict['OPTIONS'] = old_options
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def get_bench_caches(redis_url, location):
+    """
+    CACHES of a benchmark: locmem stand-in (`location` names it) or
+    Redis at `redis_url`. Benchmarks clear the cache between runs, so
+    Redis must be a dedicated database, not the configured cache with
+    sessions, idempotency keys, feeds and leaderboards.
+    """
+    if redis_url is None:
+        return {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': location,
+            }
+        }
+    if redis_url == settings.CACHES['default'].get('LOCATION'):
+        raise ValueError(
+            'Benchmark Redis must be a dedicated database, not the '
+            'configured cache: it is flushed between runs'
+        )
+    return {'default': {**settings.CACHES['default'], 'LOCATION': redis_url}}
+
+
+def run_concurrently(func, total, threads):
+    """
+    Call `func(i)` `total` times from `threads` threads.
+    Return (elapsed seconds, number of calls failed with db errors).
+    """
+    counter = iter(range(total))
+    lock = threading.Lock()
+    errors = []
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                try:
+                    func(i)
+                except OperationalError:  # "database is locked" etc.
+                    errors.append(i)
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, len(errors)
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of the values.
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = max(math.ceil(percent / 100 * len(values)) - 1, 0)
+    return values[rank]
+
+
+def summarize(latencies, queries):
+    """
+    Latency (ms) percentiles and query counts of a benchmark run.
+    """
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+    }
@@ -0,0 +1,468 @@
+import hashlib
+import json
+import time
+import uuid
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import WatchError
+from rest_framework.utils.encoders import JSONEncoder
+
+from project import perf
+from project.pagination import PaymentCursorPagination
+
+# Cache lifetime param (sec)
+CACHE_LIFETIME_PERIOD_SEC = 900
+# Cache namespaces for query-aware list caches
+COLLECT_LIST_NAMESPACE = "collect_list"
+PAYMENT_LIST_NAMESPACE = "payment_list"
+# Max payments kept in collect feed cache
+FEED_CACHE_SIZE = 200
+# Last item of feed cache that holds all collect payments
+FEED_END_MARKER = "__end__"
+# Newest feed cache payments a pushed payment is placed among
+FEED_PUSH_WINDOW = 16
+# Leaderboards (Redis sorted sets): collects by amount and by progress
+LEADERBOARD_AMOUNT_KEY = "leaderboard_collect_amount"
+LEADERBOARD_PROGRESS_KEY = "leaderboard_collect_progress"
+
+
+def get_redis():
+    """
+    Raw Redis client of the default cache or None for non Redis caches
+    (locmem in tests etc.).
+    """
+    try:
+        return get_redis_connection("default")
+    except NotImplementedError:
+        return None
+
+
+def get_collect_feed_cache_key(collect_id):
+    "Return cache id"
+    return f"collect_feed_{collect_id}"
+
+
+def get_collect_version_cache_key(collect_id):
+    "Return cache id of collect version"
+    return f"collect_version_{collect_id}"
+
+
+@perf.timer("cache")
+def cache_get(key):
+    """
+    Read cache entry, count hit or miss for request metrics.
+    """
+    value = cache.get(key)
+    perf.count("cache_hit" if value is not None else "cache_miss")
+    return value
+
+
+@perf.timer("cache")
+def cache_set(key, value, timeout=CACHE_LIFETIME_PERIOD_SEC):
+    """
+    Write cache entry.
+    """
+    cache.set(key, value, timeout=timeout)
+
+
+async def acache_get(key):
+    """
+    Async `cache_get`.
+    """
+    with perf.timer("cache"):
+        value = await cache.aget(key)
+    perf.count("cache_hit" if value is not None else "cache_miss")
+    return value
+
+
+async def acache_set(key, value, timeout=CACHE_LIFETIME_PERIOD_SEC):
+    """
+    Async `cache_set`.
+    """
+    with perf.timer("cache"):
+        await cache.aset(key, value, timeout=timeout)
+
+
+def get_generation_cache_key(namespace):
+    "Return cache id of namespace generation counter"
+    return f"{namespace}_generation"
+
+
+@perf.timer("cache")
+def get_generation(namespace):
+    """
+    Current generation of the namespace.
+    Missing counter starts from current time (ms), so keys written
+    before counter was evicted are never read again.
+    """
+    key = get_generation_cache_key(namespace)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+@perf.timer("cache")
+def bump_generation(namespace):
+    """
+    Invalidate all cached entries of the namespace in O(1):
+    old keys are no longer addressed and expire by timeout.
+    """
+    key = get_generation_cache_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+
+
+async def aget_generation(namespace):
+    """
+    Async `get_generation`.
+    """
+    key = get_generation_cache_key(namespace)
+    with perf.timer("cache"):
+        generation = await cache.aget(key)
+        if generation is None:
+            await cache.aadd(key, int(time.time() * 1000), timeout=None)
+            generation = await cache.aget(key)
+    return generation
+
+
+def get_query_digest(request):
+    """
+    Digest of request query string: params are sorted, so `?a=1&b=2`
+    and `?b=2&a=1` share one digest.
+    """
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    )
+    return hashlib.md5(urlencode(params).encode()).hexdigest()
+
+
+def get_query_cache_key(namespace, request):
+    """
+    Return cache id of the namespace for request query string.
+    """
+    digest = get_query_digest(request)
+    return f"{namespace}_{get_generation(namespace)}_{digest}"
+
+
+async def aget_query_cache_key(namespace, request):
+    """
+    Async `get_query_cache_key`.
+    """
+    digest = get_query_digest(request)
+    return f"{namespace}_{await aget_generation(namespace)}_{digest}"
+
+
+@perf.timer("cache")
+def read_feed_cache(collect_id):
+    """
+    Return (payments, complete) from collect feed cache or None if
+    there is no feed cache. `complete` means no older payments exist.
+    """
+    key = get_collect_feed_cache_key(collect_id)
+    client = get_redis()
+    if client is None:
+        cached = cache_get(key)
+        if cached is None:
+            return None
+        return cached["payments"], cached["complete"]
+    items = client.lrange(cache.make_key(key), 0, -1)
+    perf.count("cache_hit" if items else "cache_miss")
+    if not items:
+        return None
+    complete = items[-1] == FEED_END_MARKER.encode()
+    if complete:
+        items = items[:-1]
+    return [json.loads(item) for item in items], complete
+
+
+def get_feed_token_cache_key(collect_id):
+    "Return cache id of collect feed pushes counter"
+    return f"collect_feed_token_{collect_id}"
+
+
+@perf.timer("cache")
+def get_feed_token(collect_id):
+    """
+    Feed pushes counter of the collect, taken before feed cache is
+    rebuilt from DB: write_feed_cache with an outdated token is skipped,
+    so payment pushed while the feed was read is never lost.
+    """
+    key = get_feed_token_cache_key(collect_id)
+    client = get_redis()
+    if client is None:
+        return cache.get(key)
+    return client.get(cache.make_key(key))
+
+
+def bump_feed_token(collect_id, client=None):
+    """
+    Feed of the collect changed: rebuilds started before are outdated.
+    """
+    key = get_feed_token_cache_key(collect_id)
+    if client is None:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+        return
+    client.incr(cache.make_key(key))
+
+
+@perf.timer("cache")
+def write_feed_cache(collect_id, payments, complete, token):
+    """
+    Replace collect feed cache: serialized payments, newest first.
+    `token` is get_feed_token taken before payments were read, nothing
+    is written if a payment was pushed since.
+    """
+    key = get_collect_feed_cache_key(collect_id)
+    token_key = get_feed_token_cache_key(collect_id)
+    client = get_redis()
+    if client is None:
+        if cache.get(token_key) == token:
+            cache.set(key,
+                      {"payments": payments, "complete": complete},
+                      timeout=CACHE_LIFETIME_PERIOD_SEC)
+        return
+    items = [json.dumps(payment, cls=JSONEncoder) for payment in payments]
+    if complete:
+        items.append(FEED_END_MARKER)
+    key = cache.make_key(key)
+    token_key = cache.make_key(token_key)
+    with client.pipeline() as pipe:
+        try:
+            pipe.watch(token_key)
+            if pipe.get(token_key) != token:
+                return
+            pipe.multi()
+            pipe.delete(key)
+            if items:
+                pipe.rpush(key, *items)
+                pipe.expire(key, CACHE_LIFETIME_PERIOD_SEC)
+            pipe.execute()
+        except WatchError:
+            # payment pushed meanwhile: next reader rebuilds the feed
+            pass
+
+
+# feed cache is a raw Redis list: read and written by the sync client
+aread_feed_cache = sync_to_async(read_feed_cache)
+aget_feed_token = sync_to_async(get_feed_token)
+awrite_feed_cache = sync_to_async(write_feed_cache)
+
+
+def find_feed_position(items, payment):
+    """
+    Index to insert serialized `payment` at among `items` of feed cache
+    (newest first by (timestamp, id)), None if it is there already.
+    """
+    position = PaymentCursorPagination.get_position(payment)
+    for index, item in enumerate(items):
+        if item == FEED_END_MARKER.encode():
+            return index
+        item_position = PaymentCursorPagination.get_position(json.loads(item))
+        if item_position == position:
+            return None
+        if item_position < position:
+            return index
+    return len(items)
+
+
+@perf.timer("cache")
+def push_feed_cache(collect_id, payment):
+    """
+    Put new serialized payment to collect feed cache in (timestamp, id)
+    order: concurrent pushes may come in any order. Its place is looked
+    for among FEED_PUSH_WINDOW newest payments, feed is dropped if it
+    belongs deeper (reader rebuilds it).
+    List is capped by FEED_CACHE_SIZE: when the oldest payments are
+    trimmed the end marker goes first, so readers fall back to DB.
+    Missing feed is not created here, reader rebuilds it.
+    """
+    client = get_redis()
+    if client is None:
+        bump_feed_token(collect_id)
+        cache.delete(get_collect_feed_cache_key(collect_id))
+        return
+    bump_feed_token(collect_id, client)
+    key = cache.make_key(get_collect_feed_cache_key(collect_id))
+    item = json.dumps(payment, cls=JSONEncoder)
+    with client.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(key)
+                items = pipe.lrange(key, 0, FEED_PUSH_WINDOW - 1)
+                index = find_feed_position(items, payment)
+                if index is None or index == len(items) < FEED_PUSH_WINDOW:
+                    # no feed, payment is there or older than the feed
+                    return
+                pipe.multi()
+                if index == FEED_PUSH_WINDOW:
+                    pipe.delete(key)
+                elif index == 0:
+                    pipe.lpush(key, item)
+                else:
+                    pipe.linsert(key, 'AFTER', items[index - 1], item)
+                pipe.ltrim(key, 0, FEED_CACHE_SIZE - 1)
+                pipe.execute()
+                return
+            except WatchError:
+                continue
+
+
+@perf.timer("cache")
+def drop_feed_cache(collect_ids):
+    """
+    Delete feed cache of the collects, rebuilds started before are
+    not written.
+    """
+    client = get_redis()
+    for collect_id in collect_ids:
+        bump_feed_token(collect_id, client)
+    cache.delete_many([
+        get_collect_feed_cache_key(collect_id) for collect_id in collect_ids
+    ])
+
+
+@perf.timer("cache")
+def get_collect_version(collect_id):
+    """
+    Return (version, last_modified) of the collect: validators for
+    conditional requests to collect detail and feed.
+    Missing version is created, it expires with cached data (requests
+    for missing collects do not leave it forever): a lost version can
+    only make clients download the data again.
+    """
+    key = get_collect_version_cache_key(collect_id)
+    version = cache.get(key)
+    if version is None:
+        version = (uuid.uuid4().hex, timezone.now())
+        if not cache.add(key, version, timeout=CACHE_LIFETIME_PERIOD_SEC):
+            version = cache.get(key) or version
+    return version
+
+
+async def aget_collect_version(collect_id):
+    """
+    Async `get_collect_version`.
+    """
+    key = get_collect_version_cache_key(collect_id)
+    with perf.timer("cache"):
+        version = await cache.aget(key)
+        if version is None:
+            version = (uuid.uuid4().hex, timezone.now())
+            if not await cache.aadd(
+                key, version, timeout=CACHE_LIFETIME_PERIOD_SEC
+            ):
+                version = await cache.aget(key) or version
+    return version
+
+
+@perf.timer("cache")
+def bump_collect_version(collect_id):
+    """
+    Collect or its payments changed: new version, modified now.
+    Expires as the version created by readers (see get_collect_version).
+    """
+    cache.set(
+        get_collect_version_cache_key(collect_id),
+        (uuid.uuid4().hex, timezone.now()),
+        timeout=CACHE_LIFETIME_PERIOD_SEC
+    )
+
+
+def get_donors_leaderboard_key(collect_id):
+    "Return cache id of collect top donors"
+    return f"leaderboard_donors_{collect_id}"
+
+
+def get_progress_score(collect):
+    """
+    Collect progress toward target amount (1 is reached) or None for
+    collect without target or finished one.
+    """
+    if not collect.target_amount or collect.ended_at is not None:
+        return None
+    return float(collect.current_amount / collect.target_amount)
+
+
+def add_collect_scores(pipe, collect, prefix="", only_greater=False):
+    """
+    Add collect amount and progress scores to Redis `pipe`.
+    With `only_greater` scores are never lowered (ZADD GT): counters
+    of concurrent payments are read before commit, the later commit
+    may carry the smaller ones.
+    """
+    amount_key = cache.make_key(prefix + LEADERBOARD_AMOUNT_KEY)
+    progress_key = cache.make_key(prefix + LEADERBOARD_PROGRESS_KEY)
+    pipe.zadd(
+        amount_key, {collect.pk: float(collect.current_amount)},
+        gt=only_greater
+    )
+    progress = get_progress_score(collect)
+    if progress is None:
+        pipe.zrem(progress_key, collect.pk)
+    else:
+        pipe.zadd(progress_key, {collect.pk: progress}, gt=only_greater)
+
+
+@perf.timer("cache")
+def update_leaderboards(collect, user_id=None, amount=0, only_greater=False):
+    """
+    Put collect amount and progress to leaderboards, add `amount`
+    paid by the user to collect top donors.
+    Payments pass `only_greater` (see add_collect_scores), other changes
+    (target, fixed counters) may lower the scores.
+    Leaderboards are kept in Redis only.
+    """
+    client = get_redis()
+    if client is None:
+        return
+    pipe = client.pipeline(transaction=False)
+    add_collect_scores(pipe, collect, only_greater=only_greater)
+    if user_id is not None:
+        pipe.zincrby(
+            cache.make_key(get_donors_leaderboard_key(collect.pk)),
+            float(amount),
+            user_id
+        )
+    pipe.execute()
+
+
+@perf.timer("cache")
+def remove_from_leaderboards(collect_id):
+    """
+    Remove deleted collect from leaderboards.
+    """
+    client = get_redis()
+    if client is None:
+        return
+    pipe = client.pipeline(transaction=False)
+    pipe.zrem(cache.make_key(LEADERBOARD_AMOUNT_KEY), collect_id)
+    pipe.zrem(cache.make_key(LEADERBOARD_PROGRESS_KEY), collect_id)
+    pipe.delete(cache.make_key(get_donors_leaderboard_key(collect_id)))
+    pipe.execute()
+
+
+@perf.timer("cache")
+def read_leaderboard(key, limit):
+    """
+    Return top `limit` (id, score) pairs of the leaderboard, highest
+    score first, or None if there is no Redis cache.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    scores = client.zrevrange(cache.make_key(key), 0, limit - 1, withscores=True)
+    perf.count("cache_hit" if scores else "cache_miss")
+    return [(int(member), score) for member, score in scores]
@@ -0,0 +1,55 @@
+"""
+Read/write database routing: reads of safe requests go to the read
+replica (if enabled), every other read and all writes go to primary.
+Workers and management commands read from primary: `use_replica` is
+entered by ReplicaRoutingMiddleware only.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY_DATABASE = 'default'
+REPLICA_DATABASE = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """
+    Route reads of the block to read replica.
+    """
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def pin_primary():
+    """
+    Route reads of the block to primary database (inside `use_replica`).
+    """
+    return use_replica(False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Primary for writes and reads, replica for reads inside `use_replica`.
+    Without READ_REPLICA setting everything goes to primary.
+    """
+    def db_for_read(self, model, **hints):
+        if settings.READ_REPLICA and _use_replica.get():
+            return REPLICA_DATABASE
+        return PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica is a copy of primary: same objects in both
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
@@ -0,0 +1,67 @@
+"""
+Idempotency-Key support of the pay endpoint: a client retrying a
+payment (timeout, lost connection) sends the same key and gets the
+first response back instead of a second payment.
+Responses are stored in cache (Redis) per user and key, a retry is
+answered from there without a new payment. Unique (user,
+idempotency_key) of payments is the backstop when the cache entry is
+lost.
+"""
+import hashlib
+
+from django.core.cache import cache
+
+from project.cache import cache_get, cache_set
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Lifetime of stored responses (sec): retries come within minutes
+IDEMPOTENCY_TTL_SEC = 24 * 3600
+# Lock of the request in progress (sec), longer than any payment
+IDEMPOTENCY_LOCK_TTL_SEC = 30
+
+
+def get_idempotency_cache_key(user_id, key):
+    "Return cache id of the pay response stored for the key"
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idem:pay:{user_id}:{digest}"
+
+
+def get_request_fingerprint(collect_id, amount):
+    """
+    Pay request digest: the key reused for another payment is an error.
+    `amount` is the validated Decimal, so equal amounts written
+    differently ("5", 5.0) give the same digest.
+    """
+    return hashlib.sha256(f"{collect_id}:{amount}".encode()).hexdigest()
+
+
+def get_stored_response(user_id, key):
+    """
+    Stored {"fingerprint", "status", "data"} of the first request or None.
+    """
+    return cache_get(get_idempotency_cache_key(user_id, key))
+
+
+def store_response(user_id, key, fingerprint, status, data):
+    cache_set(
+        get_idempotency_cache_key(user_id, key),
+        {"fingerprint": fingerprint, "status": status, "data": data},
+        timeout=IDEMPOTENCY_TTL_SEC
+    )
+
+
+def lock_key(user_id, key):
+    """
+    Take the key for the request (atomic add), False if another request
+    with the key is in progress.
+    """
+    return cache.add(
+        get_idempotency_cache_key(user_id, key) + ":lock",
+        1,
+        timeout=IDEMPOTENCY_LOCK_TTL_SEC
+    )
+
+
+def unlock_key(user_id, key):
+    cache.delete(get_idempotency_cache_key(user_id, key) + ":lock")
@@ -0,0 +1,115 @@
+"""
+Collect image variants: resized WebP and JPEG copies of the uploaded
+original, stored next to it (`collections/photo.jpg` ->
+`collections/photo_thumb.webp`). Generated by `generate_image_variants`
+worker after upload, so requests never wait for Pillow.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Variant name -> max (width, height), aspect ratio is kept
+IMAGE_VARIANT_SIZES = {
+    'thumb': (320, 320),
+    'medium': (1024, 1024),
+}
+# Variant format -> (Pillow format, file extension, save options)
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Background of transparent images in JPEG variants
+JPEG_BACKGROUND = (255, 255, 255)
+
+
+def get_variant_name(name, variant, extension):
+    "Return storage name of the image variant"
+    root, _ = os.path.splitext(name)
+    return f"{root}_{variant}.{extension}"
+
+
+def open_image(file, size):
+    """
+    Open image for resizing to `size`: JPEG is decoded at the smallest
+    scale still larger than `size`, camera rotation (EXIF) is applied.
+    """
+    image = Image.open(file)
+    image.draft('RGB', size)
+    return ImageOps.exif_transpose(image)
+
+
+def to_rgb(image):
+    """
+    RGB copy of the image for JPEG: transparency on white background.
+    """
+    if image.mode == 'RGB':
+        return image
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, JPEG_BACKGROUND)
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(file):
+    """
+    Resize image `file` to every variant size and encode it to every
+    variant format. Return {(variant, format): encoded bytes}.
+    """
+    largest = max(IMAGE_VARIANT_SIZES.values())
+    with open_image(file, largest) as original:
+        original.load()
+        rendered = {}
+        # largest first: smaller variants are resized from previous one
+        image = original
+        for variant, size in sorted(
+            IMAGE_VARIANT_SIZES.items(), key=lambda item: item[1], reverse=True
+        ):
+            image = image.copy()
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            for fmt, (pillow_format, _, options) in IMAGE_VARIANT_FORMATS.items():
+                encoded = BytesIO()
+                prepared = image if fmt == 'webp' else to_rgb(image)
+                prepared.save(encoded, pillow_format, **options)
+                rendered[variant, fmt] = encoded.getvalue()
+    return rendered
+
+
+def save_variants(image_field):
+    """
+    Generate and store variants of the image field file next to it.
+    Return {variant: {format: storage name}}.
+    Files of previous variants are kept: a taken name gets a suffix, the
+    caller deletes old files once collect points to the new ones.
+    """
+    storage = image_field.storage
+    with image_field.open('rb') as file:
+        rendered = render_variants(file)
+    variants = {}
+    try:
+        for (variant, fmt), content in rendered.items():
+            extension = IMAGE_VARIANT_FORMATS[fmt][1]
+            name = get_variant_name(image_field.name, variant, extension)
+            variants.setdefault(variant, {})[fmt] = storage.save(
+                name, ContentFile(content)
+            )
+    except BaseException:
+        delete_variants(storage, variants)
+        raise
+    return variants
+
+
+def delete_variants(storage, variants, keep=None):
+    """
+    Delete stored variant files, except those also in `keep` variants.
+    """
+    kept = {
+        name for formats in (keep or {}).values() for name in formats.values()
+    }
+    for formats in variants.values():
+        for name in formats.values():
+            if name not in kept:
+                storage.delete(name)
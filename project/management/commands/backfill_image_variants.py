@@ -0,0 +1,35 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from project.models import Collect
+
+
+class Command(BaseCommand):
+    help = ('Queues existing collect images without variants for '
+            '`generate_image_variants` worker')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate variants of all images (new sizes or formats)'
+        )
+        parser.add_argument(
+            '--process',
+            action='store_true',
+            help='Generate queued variants now instead of by the worker'
+        )
+
+    def handle(self, *args, **options):
+        collects = Collect.objects.exclude(
+            Q(image__isnull=True) | Q(image='')
+        ).filter(image_variants_pending=False)
+        if not options['all']:
+            collects = collects.filter(image_variants={})
+        queued = collects.update(image_variants_pending=True)
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued {queued} images for variants.'
+        ))
+        if options['process']:
+            call_command('generate_image_variants', stdout=self.stdout)
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from project.models import Collect, CollectParticipant, Payment
+
+
+class Command(BaseCommand):
+    help = 'Fills collect participants table from existing payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of participants inserted per query'
+        )
+        parser.add_argument(
+            '--update-counts',
+            action='store_true',
+            help='Set collect participants counters from participants table'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # one row per (collect, user) pair: first payment is joining time
+        pairs = Payment.objects.filter(user__isnull=False).order_by().values(
+            'collect_id', 'user_id'
+        ).annotate(joined_at=Min('timestamp'))
+
+        batch = []
+        total = 0
+        for pair in pairs.iterator(chunk_size=batch_size):
+            batch.append(CollectParticipant(**pair))
+            if len(batch) >= batch_size:
+                total += self.insert(batch)
+                batch = []
+        total += self.insert(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {total} collect participants.'
+        ))
+
+        if options['update_counts']:
+            participants = CollectParticipant.objects.filter(
+                collect=OuterRef('pk')
+            ).order_by().values('collect').annotate(
+                count=Count('pk')
+            ).values('count')
+            updated = Collect.objects.update(
+                participants=Coalesce(Subquery(participants), 0)
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Updated participants of {updated} collections.'
+            ))
+
+    def insert(self, batch):
+        """
+        Insert participants, already existing ones are skipped.
+        """
+        CollectParticipant.objects.bulk_create(batch, ignore_conflicts=True)
+        return len(batch)
@@ -0,0 +1,159 @@
+import io
+import json
+import logging
+import platform
+import random
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext,
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from project.bench import get_bench_caches, summarize, temporary_database
+from project.models import Collect
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks API hot paths on a seeded temporary database: '
+            'latency percentiles and query counts, cold and warm cache')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200,
+                            help='Number of users to seed')
+        parser.add_argument('--collections', type=int, default=500,
+                            help='Number of collections to seed')
+        parser.add_argument('--payments', type=int, default=20000,
+                            help='Number of payments to seed')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed for dataset and requests')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Measured requests per endpoint and cache mode')
+        parser.add_argument(
+            '--redis-url',
+            default=None,
+            help='Benchmark with Redis at the URL instead of locmem stand-in; '
+                 'a dedicated database (e.g. redis://redis:6379/15), it is '
+                 'flushed between runs'
+        )
+        parser.add_argument('--output', default=None,
+                            help='Write JSON results to the file instead of stdout')
+
+    def handle(self, *args, **options):
+        # per-request log lines would flood the output, slow ones are kept
+        logging.getLogger('project.perf').setLevel(logging.WARNING)
+        try:
+            caches = get_bench_caches(options['redis_url'], 'bench')
+        except ValueError as exc:
+            raise CommandError(exc)
+        setup_test_environment()
+        try:
+            # dataset leaderboards go to the benchmark cache too
+            with temporary_database(), override_settings(CACHES=caches):
+                call_command(
+                    'generate_fake_data',
+                    bulk=True,
+                    seed=options['seed'],
+                    users=options['users'],
+                    collections=options['collections'],
+                    payments=options['payments'],
+                    stdout=io.StringIO(),
+                )
+                results = self.run_benchmarks(options)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': 'redis' if options['redis_url'] else 'locmem',
+                'dataset': {
+                    'users': options['users'],
+                    'collections': options['collections'],
+                    'payments': options['payments'],
+                    'seed': options['seed'],
+                },
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+            self.stderr.write(f'Results written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, options):
+        rnd = random.Random(options['seed'])
+        client = APIClient()
+        client.force_authenticate(User.objects.order_by('pk').first())
+        collect_ids = list(Collect.objects.values_list('pk', flat=True))
+        requests = options['requests']
+
+        def sample(path):
+            return [
+                path.format(id=rnd.choice(collect_ids))
+                for _ in range(requests)
+            ]
+
+        scenarios = [
+            ('collection_list', 'get', [
+                f'/api/collections/?page={rnd.randint(1, 5)}'
+                for _ in range(requests)
+            ]),
+            ('collection_retrieve', 'get', sample('/api/collections/{id}/')),
+            ('collection_feed', 'get', sample('/api/collections/{id}/feed/')),
+            ('payment_list', 'get', ['/api/payments/'] * requests),
+            ('pay', 'post', sample('/api/collections/{id}/pay/')),
+        ]
+        results = []
+        for name, method, urls in scenarios:
+            for warm in (False, True):
+                results.append({
+                    'endpoint': name,
+                    'cache': 'warm' if warm else 'cold',
+                    **self.measure(client, method, urls, warm),
+                })
+                self.stderr.write(
+                    f'{name} ({results[-1]["cache"]}): '
+                    f'p50 {results[-1]["p50_ms"]} ms, '
+                    f'p99 {results[-1]["p99_ms"]} ms'
+                )
+        return results
+
+    def measure(self, client, method, urls, warm):
+        """
+        Cold: cache cleared before every request.
+        Warm: every url requested once before measuring.
+        """
+        request = getattr(client, method)
+        data = {'amount': 10} if method == 'post' else None
+        cache.clear()
+        if warm:
+            for url in urls:
+                request(url, data, format='json')
+        latencies, queries, statuses = [], [], {}
+        for url in urls:
+            if not warm:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = request(url, data, format='json')
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return {**summarize(latencies, queries), 'statuses': statuses}
@@ -0,0 +1,224 @@
+import asyncio
+import io
+import json
+import logging
+import platform
+import random
+import re
+import threading
+import time
+
+import django
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.utils import timezone
+
+from project.bench import (
+    get_bench_caches,
+    run_concurrently,
+    summarize,
+    temporary_database,
+)
+from project.models import Collect
+
+# DB queries count of the request from PerformanceMiddleware header
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+def get_queries(response):
+    match = SERVER_TIMING_QUERIES.search(response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else 0
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks read endpoints under concurrent requests: sync '
+            'viewsets through WSGI handler (threads) against async views '
+            'through ASGI handler (asyncio tasks), on a seeded temporary '
+            'database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200,
+                            help='Number of users to seed')
+        parser.add_argument('--collections', type=int, default=500,
+                            help='Number of collections to seed')
+        parser.add_argument('--payments', type=int, default=20000,
+                            help='Number of payments to seed')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed for dataset and requests')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Measured requests per endpoint and server')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Requests in flight: WSGI threads or ASGI tasks')
+        parser.add_argument(
+            '--redis-url',
+            default=None,
+            help='Benchmark with Redis at the URL instead of locmem stand-in; '
+                 'a dedicated database (e.g. redis://redis:6379/15), it is '
+                 'flushed between runs'
+        )
+        parser.add_argument('--output', default=None,
+                            help='Write JSON results to the file instead of stdout')
+
+    def handle(self, *args, **options):
+        # per-request log lines would flood the output, slow ones are kept
+        logging.getLogger('project.perf').setLevel(logging.WARNING)
+        try:
+            caches = get_bench_caches(options['redis_url'], 'bench_async')
+        except ValueError as exc:
+            raise CommandError(exc)
+        setup_test_environment()
+        try:
+            # dataset leaderboards go to the benchmark cache too;
+            # query counts are read from Server-Timing header
+            with temporary_database(), override_settings(
+                    CACHES=caches, PERF_VERBOSE=True):
+                call_command(
+                    'generate_fake_data',
+                    bulk=True,
+                    seed=options['seed'],
+                    users=options['users'],
+                    collections=options['collections'],
+                    payments=options['payments'],
+                    stdout=io.StringIO(),
+                )
+                results = self.run_benchmarks(options)
+        finally:
+            teardown_test_environment()
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'cache': 'redis' if options['redis_url'] else 'locmem',
+                'concurrency': options['concurrency'],
+                'dataset': {
+                    'users': options['users'],
+                    'collections': options['collections'],
+                    'payments': options['payments'],
+                    'seed': options['seed'],
+                },
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+            self.stderr.write(f'Results written to {options["output"]}')
+        else:
+            self.stdout.write(output)
+
+    def run_benchmarks(self, options):
+        rnd = random.Random(options['seed'])
+        collect_ids = list(Collect.objects.values_list('pk', flat=True))
+        requests = options['requests']
+
+        def sample(path):
+            return [
+                path.format(id=rnd.choice(collect_ids))
+                for _ in range(requests)
+            ]
+
+        # same urls for both servers, sync ones are under /api/async/
+        scenarios = [
+            ('collection_list', [
+                f'/collections/?page={rnd.randint(1, 5)}'
+                for _ in range(requests)
+            ]),
+            ('collection_retrieve', sample('/collections/{id}/')),
+            ('collection_feed', sample('/collections/{id}/feed/')),
+            ('payment_list', ['/payments/'] * requests),
+        ]
+        servers = [
+            ('wsgi', '/api', self.measure_wsgi),
+            ('asgi', '/api/async', self.measure_asgi),
+        ]
+        results = []
+        for name, paths in scenarios:
+            for server, prefix, measure in servers:
+                cache.clear()
+                urls = [prefix + path for path in paths]
+                results.append({
+                    'endpoint': name,
+                    'server': server,
+                    **measure(urls, options['concurrency']),
+                })
+                self.stderr.write(
+                    f'{name} ({server}): '
+                    f'{results[-1]["throughput_rps"]} req/s, '
+                    f'p50 {results[-1]["p50_ms"]} ms, '
+                    f'p99 {results[-1]["p99_ms"]} ms'
+                )
+        return results
+
+    @staticmethod
+    def report(elapsed, latencies, queries, statuses):
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            **summarize(latencies, queries),
+            'statuses': statuses,
+        }
+
+    def measure_wsgi(self, urls, concurrency):
+        """
+        Sync viewsets: WSGI handler called from `concurrency` threads,
+        as by a threaded WSGI server.
+        """
+        local = threading.local()
+        lock = threading.Lock()
+        latencies, queries, statuses = [], [], {}
+
+        def get(i):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.get(urls[i])
+            latency = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(latency)
+                queries.append(get_queries(response))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        elapsed, errors = run_concurrently(get, len(urls), concurrency)
+        if errors:
+            statuses['db_errors'] = errors
+        return self.report(elapsed, latencies, queries, statuses)
+
+    def measure_asgi(self, urls, concurrency):
+        """
+        Async views: ASGI handler with `concurrency` requests in flight
+        on one event loop, as by an ASGI server worker.
+        """
+        latencies, queries, statuses = [], [], {}
+
+        async def worker(pending):
+            client = AsyncClient()
+            while pending:
+                url = pending.pop()
+                started = time.perf_counter()
+                response = await client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(get_queries(response))
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def run():
+            pending = list(reversed(urls))
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                worker(pending) for _ in range(concurrency)
+            ))
+            return time.perf_counter() - started
+
+        elapsed = asyncio.run(run())
+        return self.report(elapsed, latencies, queries, statuses)
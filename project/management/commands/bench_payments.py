@@ -0,0 +1,137 @@
+import random
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from project.bench import run_concurrently, temporary_database
+from project.models import Collect, Payment
+
+
+def legacy_add_payment(collect, user, amount):
+    """
+    Collect.add_payment before single-UPDATE rework: row lock, INSERT,
+    two UPDATEs, EXISTS and refresh. Kept here as the baseline.
+    """
+    with transaction.atomic():
+        collect = Collect.objects.select_for_update().get(pk=collect.pk)
+        payment = Payment.objects.create(
+            user=user,
+            collect=collect,
+            amount=amount
+        )
+        Collect.objects.filter(pk=collect.pk).update(
+            current_amount=F('current_amount') + amount
+        )
+        previous_payments = Payment.objects.filter(
+            user=user,
+            collect=collect
+        ).exclude(pk=payment.pk)
+        if not previous_payments.exists():
+            Collect.objects.filter(pk=collect.pk).update(
+                participants=F('participants') + 1
+            )
+        collect.refresh_from_db()
+        if (collect.target_amount and collect.current_amount >= collect.target_amount and not collect.ended_at):
+            Collect.objects.filter(pk=collect.pk).update(ended_at=timezone.now())
+        return payment
+
+
+STRATEGIES = {
+    'legacy': legacy_add_payment,
+    'current': lambda collect, user, amount: collect.add_payment(user, amount),
+}
+
+
+class Command(BaseCommand):
+    help = ('Contention benchmark: concurrent payments into one collection '
+            'with default and tuned SQLite settings (runs on a temporary '
+            'database)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--payments',
+            type=int,
+            default=1000,
+            help='Number of payments per strategy'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='Number of concurrent payers'
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=50,
+            help='Number of distinct payers'
+        )
+        parser.add_argument(
+            '--strategy',
+            choices=['legacy', 'current', 'both'],
+            default='both',
+            help='add_payment implementation to measure'
+        )
+        parser.add_argument(
+            '--sqlite-profile',
+            choices=['default', 'tuned', 'both'],
+            default='both',
+            help='SQLite settings: defaults and/or SQLITE_TUNED_OPTIONS'
+        )
+
+    def handle(self, *args, **options):
+        strategies = list(STRATEGIES)
+        if options['strategy'] != 'both':
+            strategies = [options['strategy']]
+        profiles = {
+            'default': {},
+            'tuned': settings.SQLITE_TUNED_OPTIONS,
+        }
+        if options['sqlite_profile'] != 'both':
+            profiles = {
+                options['sqlite_profile']: profiles[options['sqlite_profile']]
+            }
+        if connections['default'].vendor != 'sqlite':
+            profiles = {'configured': None}
+
+        for profile, database_options in profiles.items():
+            # fresh database per profile: journal mode is kept in the file
+            with temporary_database(database_options):
+                users = User.objects.bulk_create(
+                    User(username=f'bench_payer_{i}')
+                    for i in range(options['users'])
+                )
+                for name in strategies:
+                    self.run(profile, name, users, options)
+
+    def run(self, profile, name, users, options):
+        add_payment = STRATEGIES[name]
+        collect = Collect.objects.create(
+            author=users[0],
+            title=f'Contention benchmark: {name}',
+            purpose='charity',
+        )
+
+        def pay(i):
+            add_payment(collect, random.choice(users), Decimal('10.00'))
+
+        elapsed, errors = run_concurrently(
+            pay, options['payments'], options['threads']
+        )
+        done = options['payments'] - errors
+        # concurrent first payments of a user must count it once
+        collect.refresh_from_db()
+        payers = Payment.objects.filter(
+            collect=collect
+        ).values('user').distinct().count()
+        self.stdout.write(
+            f'{profile} sqlite, {name}: {done} payments, '
+            f'{options["threads"]} threads, {elapsed:.2f}s, '
+            f'{done / elapsed:.1f} payments/s, {errors} errors, '
+            f'{collect.participants} participants of {payers} payers'
+        )
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from project.cache import COLLECT_LIST_NAMESPACE, bump_generation
+from project.models import Collect, CollectCounterShard
+
+
+class Command(BaseCommand):
+    help = ('Moves counter shards of collects in sharded counters mode '
+            'to their amount and participants counters')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Run as worker: fold shards periodically'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30,
+            help='Seconds between folds (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.fold()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def fold(self):
+        """
+        Fold shards of every collect with not folded payments.
+        """
+        collect_ids = list(CollectCounterShard.objects.exclude(
+            amount=0, participants=0
+        ).order_by().values_list('collect_id', flat=True).distinct())
+        if not collect_ids:
+            return
+        amount = finished = 0
+        for collect_id in collect_ids:
+            folded, collect_finished = Collect.fold_counter_shards(collect_id)
+            amount += folded
+            finished += collect_finished
+        if finished:
+            bump_generation(COLLECT_LIST_NAMESPACE)
+        self.stdout.write(
+            f'Folded {amount} into {len(collect_ids)} collections, '
+            f'{finished} finished.'
+        )
@@ -1,12 +1,83 @@
 # myapp/management/commands/fill_fake_data.py
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
-from project.models import Collect, Payment
+from django.contrib.auth.hashers import make_password
+from django.db.models import F, Sum, Window
+from project.cache import get_redis
+from project.models import Collect, CollectParticipant, Payment
 from faker import Faker
 import random
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
 from django.utils import timezone
 from decimal import Decimal
 
+# Payments generated by one task of the bulk mode
+PAYMENTS_CHUNK_SIZE = 50000
+# Collect created_at timestamps, set in the bulk mode worker processes
+_collect_created = []
+
+
+def _init_payments_worker(collect_created):
+    global _collect_created
+    _collect_created = collect_created
+
+
+def generate_payment_rows(seed, chunk, size, num_users, now):
+    """
+    Generate payments chunk as (collect index, user index, amount,
+    timestamp) tuples. Every chunk has its own random generator seeded
+    from (seed, chunk), so result does not depend on number of workers.
+    """
+    rnd = random.Random(f'{seed}-{chunk}')
+    rows = []
+    for _ in range(size):
+        collect_index = rnd.randrange(len(_collect_created))
+        created = _collect_created[collect_index]
+        rows.append((
+            collect_index,
+            rnd.randrange(num_users),
+            rnd.randint(100, 5000),
+            created + rnd.random() * (now - created),
+        ))
+    return rows
+
+
+def get_finishing_payments(collect_ids):
+    """
+    {collect id: timestamp} of the payments that reached target amount
+    of the collects: running total of the collect payments in
+    (timestamp, id) order crosses the target on them.
+    """
+    running = Window(
+        Sum('amount'),
+        partition_by=[F('collect_id')],
+        order_by=[F('timestamp').asc(), F('id').asc()],
+    )
+    payments = Payment.objects.filter(collect_id__in=collect_ids).annotate(
+        running=running,
+        target=F('collect__target_amount'),
+    ).filter(
+        running__gte=F('target'),
+        running__lt=F('target') + F('amount'),
+    )
+    return dict(payments.values_list('collect_id', 'timestamp'))
+
+
+@contextmanager
+def explicit_auto_now_add(model, field_name):
+    """
+    Keep explicit values of auto_now_add field in bulk_create.
+    """
+    field = model._meta.get_field(field_name)
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
 
 class Command(BaseCommand):
     help = 'Populates the database with fake users, collections, and payments'
@@ -35,9 +106,36 @@ class Command(BaseCommand):
             action='store_true',
             help='Clear existing data before populating'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help=('High-volume mode: bulk inserts, collections amounts and '
+                  'participants computed from generated payments')
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for reproducible data'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of rows per insert query (with --bulk)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes generating payments (with --bulk)'
+        )
 
     def handle(self, *args, **options):
         fake = Faker('en_US')  # English localization
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+            fake.seed_instance(options['seed'])
 
         num_users = options['users']
         num_collections = options['collections']
@@ -51,6 +149,9 @@ class Command(BaseCommand):
             User.objects.filter(is_superuser=False).delete()
             self.stdout.write(self.style.SUCCESS('Data cleared.'))
 
+        if options['bulk']:
+            return self.handle_bulk(fake, options)
+
         # Create users
         users = []
         for i in range(num_users):
@@ -153,6 +254,8 @@ class Command(BaseCommand):
             if i % 500 == 0 and i > 0:
                 self.stdout.write(f'Created {i} payments...')
 
+        self.rebuild_aggregates(options)
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Database successfully populated:\n'
@@ -161,3 +264,179 @@ class Command(BaseCommand):
                 f'{num_payments} payments'
             )
         )
+
+    def handle_bulk(self, fake, options):
+        """
+        High-volume mode: every table is filled by bulk inserts.
+        """
+        batch_size = options['batch_size']
+        seed = options['seed'] if options['seed'] is not None else random.random()
+        now = timezone.now()
+
+        # Create users: password is hashed once for all of them
+        password = make_password('password123')
+        usernames = [
+            f'{fake.user_name()}{i}'[:150] for i in range(options['users'])
+        ]
+        User.objects.bulk_create(
+            (
+                User(
+                    username=username,
+                    email=fake.email(),
+                    first_name=fake.first_name(),
+                    last_name=fake.last_name(),
+                    password=password,
+                )
+                for username in usernames
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        users = []
+        for i in range(0, len(usernames), batch_size):
+            users += User.objects.filter(
+                username__in=usernames[i:i + batch_size]
+            ).only('pk')
+        self.stdout.write(self.style.SUCCESS(f'Created/Retrieved {len(users)} users.'))
+
+        # Create collections: amounts and participants are set later
+        purposes = [choice[0] for choice in Collect.PURPOSE_CHOICES]
+        collections = [
+            Collect(
+                author=random.choice(users),
+                title=fake.sentence(nb_words=4).rstrip('.'),
+                purpose=random.choice(purposes),
+                description=fake.paragraph(nb_sentences=3),
+                # 30% of collections have no target amount
+                target_amount=(
+                    None if random.random() < 0.3
+                    else Decimal(random.randint(5000, 100000))
+                ),
+                created_at=fake.date_time_between(
+                    start_date='-3y',
+                    end_date=now,
+                    tzinfo=timezone.get_current_timezone()
+                ),
+            )
+            for _ in range(options['collections'])
+        ]
+        with explicit_auto_now_add(Collect, 'created_at'):
+            collections = Collect.objects.bulk_create(
+                collections, batch_size=batch_size
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(collections)} collections.')
+            )
+
+        # Create payments: rows are generated in worker processes
+        num_payments = options['payments']
+        chunks = [
+            (seed, chunk, min(PAYMENTS_CHUNK_SIZE, num_payments - start),
+             len(users), now.timestamp())
+            for chunk, start in enumerate(
+                range(0, num_payments, PAYMENTS_CHUNK_SIZE)
+            )
+        ]
+        collect_created = [collect.created_at.timestamp() for collect in collections]
+        if options['workers'] > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=_init_payments_worker,
+                initargs=(collect_created,),
+            )
+            row_chunks = executor.map(generate_payment_rows, *zip(*chunks))
+        else:
+            executor = None
+            _init_payments_worker(collect_created)
+            row_chunks = (generate_payment_rows(*chunk) for chunk in chunks)
+
+        totals = [Decimal(0)] * len(collections)
+        joined = {}
+        created = 0
+        try:
+            with explicit_auto_now_add(Payment, 'timestamp'):
+                for rows in row_chunks:
+                    payments = []
+                    for collect_index, user_index, amount, paid in rows:
+                        paid = datetime.fromtimestamp(paid, tz=now.tzinfo)
+                        payments.append(Payment(
+                            collect=collections[collect_index],
+                            user=users[user_index],
+                            amount=Decimal(amount),
+                            timestamp=paid,
+                        ))
+                        totals[collect_index] += amount
+                        pair = (collect_index, user_index)
+                        if pair not in joined or paid < joined[pair]:
+                            joined[pair] = paid
+                    Payment.objects.bulk_create(payments, batch_size=batch_size)
+                    created += len(payments)
+                    self.stdout.write(f'Created {created} payments...')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        # Participants and collect counters match generated payments
+        participants = [0] * len(collections)
+        for collect_index, _ in joined:
+            participants[collect_index] += 1
+        CollectParticipant.objects.bulk_create(
+            (
+                CollectParticipant(
+                    collect=collections[collect_index],
+                    user=users[user_index],
+                    joined_at=joined_at,
+                )
+                for (collect_index, user_index), joined_at in joined.items()
+            ),
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        finished = [
+            collect.pk
+            for i, collect in enumerate(collections)
+            if collect.target_amount and totals[i] >= collect.target_amount
+        ]
+        finished_at = {}
+        for i in range(0, len(finished), batch_size):
+            finished_at.update(
+                get_finishing_payments(finished[i:i + batch_size])
+            )
+        for i, collect in enumerate(collections):
+            collect.current_amount = totals[i]
+            collect.participants = participants[i]
+            # collect reached its target is finished by the payment
+            # that reached it
+            collect.ended_at = finished_at.get(collect.pk)
+        Collect.objects.bulk_update(
+            collections,
+            ['current_amount', 'participants', 'ended_at'],
+            batch_size=batch_size,
+        )
+        self.rebuild_aggregates(options)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Database successfully populated:\n'
+                f'{len(users)} users\n'
+                f'{len(collections)} collections\n'
+                f'{created} payments'
+            )
+        )
+
+    def rebuild_aggregates(self, options):
+        """
+        Payments are inserted bypassing Collect.add_payment,
+        so daily stats and leaderboards are computed after all of them.
+        """
+        call_command(
+            'rebuild_daily_stats',
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        if get_redis() is not None:
+            call_command(
+                'rebuild_leaderboards',
+                batch_size=options['batch_size'],
+                stdout=self.stdout,
+            )
@@ -0,0 +1,104 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+
+from project.cache import (
+    COLLECT_LIST_NAMESPACE,
+    bump_collect_version,
+    bump_generation,
+)
+from project.images import delete_variants, save_variants
+from project.models import Collect
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Generates resized WebP/JPEG variants of uploaded collect images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Number of images taken from the queue at once'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Run as worker: keep polling the queue'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls of empty queue (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        # images left queued (storage errors) are retried on the next pass
+        last_id = 0
+        while True:
+            last_id = self.process_batch(options['batch_size'], last_id)
+            if last_id:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def process_batch(self, batch_size, after=0):
+        """
+        Generate variants of one batch of queued images with id > `after`.
+        Return id of the last processed image, 0 if there were none.
+        """
+        collects = list(Collect.objects.filter(
+            image_variants_pending=True, id__gt=after
+        ).only('image', 'image_variants').order_by('id')[:batch_size])
+        if not collects:
+            return 0
+
+        done = failed = 0
+        for collect in collects:
+            if self.process(collect):
+                done += 1
+            else:
+                failed += 1
+        bump_generation(COLLECT_LIST_NAMESPACE)
+        self.stdout.write(
+            f'Generated variants of {done} images, {failed} failed, '
+            'replaced or left for retry.'
+        )
+        return collects[-1].pk
+
+    def process(self, collect):
+        """
+        Store variants of the collect image, return True on success.
+        Previous variants are served until the new ones are saved, then
+        deleted. Image replaced meanwhile stays queued, the new variants
+        are deleted. Image that can not be decoded is taken out of the
+        queue, other errors (storage) leave it queued for retry.
+        """
+        storage = collect.image.storage
+        variants = {}
+        try:
+            variants = save_variants(collect.image)
+        except (UnidentifiedImageError, Image.DecompressionBombError):
+            logger.exception('Image of collect %s can not be decoded', collect.pk)
+        except OSError:
+            logger.exception(
+                'Image variants of collect %s failed, will retry', collect.pk
+            )
+            return False
+        updated = Collect.objects.filter(
+            pk=collect.pk,
+            image=collect.image.name,
+            image_variants_pending=True,
+        ).update(image_variants=variants, image_variants_pending=False)
+        if not updated:
+            delete_variants(storage, variants)
+            return False
+        delete_variants(storage, collect.image_variants, keep=variants)
+        bump_collect_version(collect.pk)
+        return bool(variants)
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncDate
+
+from project.models import CollectDailyStats, CollectParticipant, Payment
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds daily collect stats (rollups) from payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rollups inserted per query'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        # one row per (collect, day) pair
+        rollups = Payment.objects.order_by().annotate(
+            day=TruncDate('timestamp')
+        ).values('collect_id', 'day').annotate(
+            amount=Sum('amount'),
+            payments=Count('pk'),
+            donors=Count('user', distinct=True),
+        )
+        # unique donors of next payments are counted from last payment day
+        last_paid_on = Payment.objects.filter(
+            collect=OuterRef('collect'),
+            user=OuterRef('user'),
+        ).order_by().values('collect').annotate(
+            day=Max(TruncDate('timestamp'))
+        ).values('day')
+
+        with transaction.atomic():
+            CollectDailyStats.objects.all().delete()
+            batch = []
+            total = 0
+            for rollup in rollups.iterator(chunk_size=batch_size):
+                batch.append(CollectDailyStats(**rollup))
+                if len(batch) >= batch_size:
+                    total += self.insert(batch)
+                    batch = []
+            total += self.insert(batch)
+            CollectParticipant.objects.update(
+                last_paid_on=Subquery(last_paid_on)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {total} daily collect stats.'
+        ))
+
+    def insert(self, batch):
+        CollectDailyStats.objects.bulk_create(batch)
+        return len(batch)
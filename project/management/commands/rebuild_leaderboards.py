@@ -0,0 +1,119 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from project.cache import (
+    LEADERBOARD_AMOUNT_KEY,
+    LEADERBOARD_PROGRESS_KEY,
+    add_collect_scores,
+    get_donors_leaderboard_key,
+    get_redis,
+    )
+from project.models import Collect, Payment, get_shard_counter_annotations
+
+# Leaderboards are built under prefixed keys and renamed at the end
+REBUILD_PREFIX = 'rebuild_'
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds Redis leaderboards (top collections and donors) from DB'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows sent to Redis per pipeline'
+        )
+
+    def handle(self, *args, **options):
+        client = get_redis()
+        if client is None:
+            raise CommandError('Leaderboards are kept in Redis cache only')
+        batch_size = options['batch_size']
+        # leftovers of an interrupted rebuild
+        leftovers = list(client.scan_iter(
+            cache.make_key(REBUILD_PREFIX + 'leaderboard_*')
+        ))
+        if leftovers:
+            client.delete(*leftovers)
+
+        # Collects by amount and progress: built aside, then swapped
+        pipe = client.pipeline(transaction=False)
+        collects = Collect.objects.order_by().annotate(
+            **get_shard_counter_annotations()
+        ).only(
+            'current_amount', 'participants', 'target_amount', 'ended_at'
+        )
+        total = 0
+        for collect in collects.iterator(chunk_size=batch_size):
+            collect.current_amount, _ = collect.get_combined_counters()
+            add_collect_scores(pipe, collect, prefix=REBUILD_PREFIX)
+            total += 1
+            if total % batch_size == 0:
+                pipe.execute()
+        pipe.execute()
+        for key in (LEADERBOARD_AMOUNT_KEY, LEADERBOARD_PROGRESS_KEY):
+            self.swap(client, REBUILD_PREFIX + key, key)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt collect leaderboards: {total} collections.'
+        ))
+
+        # Top donors of each collect
+        old_keys = set(client.scan_iter(
+            cache.make_key(get_donors_leaderboard_key('*'))
+        ))
+        donors = Payment.objects.filter(user__isnull=False).order_by(
+            'collect_id'
+        ).values('collect_id', 'user_id').annotate(amount=Sum('amount'))
+        collect_id = None
+        rows = 0
+        for row in donors.iterator(chunk_size=batch_size):
+            if row['collect_id'] != collect_id:
+                if collect_id is not None:
+                    self.swap_donors(pipe, collect_id, old_keys)
+                collect_id = row['collect_id']
+            pipe.zadd(
+                cache.make_key(
+                    REBUILD_PREFIX + get_donors_leaderboard_key(collect_id)
+                ),
+                {row['user_id']: float(row['amount'])}
+            )
+            rows += 1
+            if rows % batch_size == 0:
+                pipe.execute()
+        if collect_id is not None:
+            self.swap_donors(pipe, collect_id, old_keys)
+        # collects without payments left
+        for key in old_keys:
+            pipe.delete(key)
+        pipe.execute()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt top donors: {rows} donors.'
+        ))
+
+    @staticmethod
+    def swap(client, source, destination):
+        """
+        Replace leaderboard with the rebuilt one at once.
+        """
+        source = cache.make_key(source)
+        destination = cache.make_key(destination)
+        if client.exists(source):
+            client.rename(source, destination)
+        else:
+            client.delete(destination)
+
+    @staticmethod
+    def swap_donors(pipe, collect_id, old_keys):
+        """
+        Replace collect top donors with the rebuilt one.
+        """
+        key = cache.make_key(get_donors_leaderboard_key(collect_id))
+        pipe.rename(
+            cache.make_key(
+                REBUILD_PREFIX + get_donors_leaderboard_key(collect_id)
+            ),
+            key
+        )
+        old_keys.discard(key.encode())
@@ -0,0 +1,168 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count, F, Max, Min, Sum
+
+from project.cache import (
+    COLLECT_LIST_NAMESPACE,
+    bump_collect_version,
+    bump_generation,
+    update_leaderboards,
+)
+from project.models import Collect, get_shard_counter_annotations
+
+
+def counters_fixed(collect):
+    """
+    Collect counters were fixed: refresh its version and leaderboards.
+    """
+    bump_collect_version(collect.pk)
+    update_leaderboards(collect)
+
+
+def reconcile_chunk(start, stop, fix):
+    """
+    Compare counters of collects with ids in [start, stop) to their
+    payments (amount sum and distinct donors) by one grouped query, so
+    both are read from one snapshot. Not folded counter shards count
+    as stored, also those left after sharded mode was switched off.
+    With `fix` the drift is added to the counters (`F() + drift`):
+    payments made meanwhile are kept, no rows are locked.
+    Return (checked collects, drifts), drift is (id, stored amount,
+    actual amount, stored participants, actual participants).
+    """
+    rows = list(Collect.objects.filter(
+        id__gte=start, id__lt=stop
+    ).annotate(
+        **get_shard_counter_annotations(sharded_only=False)
+    ).order_by().values(
+        'id', 'current_amount', 'participants',
+        'shard_amount', 'shard_participants'
+    ).annotate(
+        amount=Sum('payments__amount'),
+        donors=Count('payments__user', distinct=True),
+    ))
+    drifts = [
+        (
+            row['id'],
+            row['current_amount'] + (row['shard_amount'] or 0),
+            row['amount'] or 0,
+            row['participants'] + (row['shard_participants'] or 0),
+            row['donors'],
+        )
+        for row in rows
+    ]
+    drifts = [
+        drift for drift in drifts
+        if (drift[1], drift[3]) != (drift[2], drift[4])
+    ]
+    if fix and drifts:
+        fixed = [
+            Collect(
+                pk=pk,
+                current_amount=F('current_amount') + (actual - amount),
+                participants=F('participants') + (donors - participants),
+            )
+            for pk, amount, actual, participants, donors in drifts
+        ]
+        Collect.objects.bulk_update(
+            fixed, ['current_amount', 'participants']
+        )
+        for collect in Collect.objects.filter(
+            pk__in=[drift[0] for drift in drifts]
+        ).annotate(
+            **get_shard_counter_annotations(sharded_only=False)
+        ).only(
+            'current_amount', 'participants', 'target_amount', 'ended_at'
+        ):
+            collect.current_amount, _ = collect.get_combined_counters()
+            counters_fixed(collect)
+    return len(rows), drifts
+
+
+class Command(BaseCommand):
+    help = ('Checks collect amount and participants counters against '
+            'payments, reports drift and optionally fixes it')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of collect ids checked by one pair of queries'
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Set drifted counters from payments (bulk updates)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes checking chunks in parallel'
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=20,
+            help='Number of drifted collections listed'
+        )
+
+    def handle(self, *args, **options):
+        bounds = Collect.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No collections.')
+            return
+        chunk_size = options['chunk_size']
+        chunks = [
+            (start, start + chunk_size, options['fix'])
+            for start in range(bounds['first'], bounds['last'] + 1, chunk_size)
+        ]
+        if options['workers'] > 1:
+            # forked workers must not share connections of this process
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'])
+            results = executor.map(reconcile_chunk, *zip(*chunks))
+        else:
+            executor = None
+            results = (reconcile_chunk(*chunk) for chunk in chunks)
+
+        checked = drifted = 0
+        amount_drift = 0
+        shown = []
+        try:
+            for chunk_checked, drifts in results:
+                checked += chunk_checked
+                drifted += len(drifts)
+                amount_drift += sum(
+                    actual - amount for _, amount, actual, _, _ in drifts
+                )
+                shown += drifts[:options['show'] - len(shown)]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        for pk, amount, actual_amount, participants, actual_participants in shown:
+            self.stdout.write(
+                f'Collect {pk}: amount {amount} != {actual_amount}, '
+                f'participants {participants} != {actual_participants}'
+            )
+        if drifted > len(shown):
+            self.stdout.write(f'... and {drifted - len(shown)} more')
+        summary = (
+            f'Checked {checked} collections, {drifted} drifted '
+            f'(amount drift {amount_drift}).'
+        )
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(summary))
+        elif options['fix']:
+            bump_generation(COLLECT_LIST_NAMESPACE)
+            self.stdout.write(self.style.SUCCESS(
+                f'{summary} Fixed {drifted} collections.'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f'{summary} Run with --fix to update them.'
+            ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+
+from project.models import Collect, CollectSearchIndex
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds collections full-text search index from the '
+            'collections table in one transaction')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(CollectSearchIndex)
+        connection = connections[using]
+        index = CollectSearchIndex._meta.db_table
+
+        # FTS5 'rebuild' reads the external content table in the same
+        # transaction: triggers of concurrent edits never see the index
+        # half-built (their 'delete' of a row not indexed yet would
+        # corrupt it), collections are locked for writes meanwhile
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+            total = Collect.objects.using(using).count()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('optimize')")
+        self.stdout.write(self.style.SUCCESS(
+            f'Reindexed {total} collections.'
+        ))
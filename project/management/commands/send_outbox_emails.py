@@ -0,0 +1,117 @@
+import time
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from project.models import OutboxEmail
+
+# Retry delay: BACKOFF_BASE_SEC * 2 ** (attempts - 1), up to BACKOFF_MAX_SEC
+BACKOFF_BASE_SEC = 30
+BACKOFF_MAX_SEC = 3600
+# Claimed emails are not taken by other workers for this time
+CLAIM_LEASE = timedelta(minutes=10)
+
+
+class Command(BaseCommand):
+    help = 'Sends queued outbox emails in batches over one mail connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Number of emails sent over one connection'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='Attempts before email is marked as failed'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Run as worker: keep polling the outbox'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls of empty outbox (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.send_batch(
+                options['batch_size'], options['max_attempts']
+            )
+            if processed:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def send_batch(self, batch_size, max_attempts):
+        """
+        Send one batch of due emails. Return number of processed emails.
+        Batch is claimed first, so concurrent workers never send one
+        email twice.
+        """
+        emails = OutboxEmail.claim(batch_size, CLAIM_LEASE)
+        if not emails:
+            return 0
+
+        sent = failed = 0
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as error:
+            for email in emails:
+                self.retry(email, error, max_attempts)
+            failed = len(emails)
+        else:
+            for email in emails:
+                message = EmailMessage(
+                    email.subject,
+                    email.message,
+                    email.from_email,
+                    [email.recipient],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as error:
+                    self.retry(email, error, max_attempts)
+                    failed += 1
+                else:
+                    email.claim_token = ''
+                    email.status = OutboxEmail.SENT
+                    email.sent_at = timezone.now()
+                    sent += 1
+        finally:
+            connection.close()
+
+        OutboxEmail.objects.bulk_update(
+            emails,
+            ['status', 'attempts', 'next_attempt_at', 'claim_token',
+             'last_error', 'sent_at']
+        )
+        self.stdout.write(f'Sent {sent} emails, {failed} failed.')
+        return len(emails)
+
+    def retry(self, email, error, max_attempts):
+        """
+        Schedule next attempt with exponential backoff or give up.
+        """
+        email.claim_token = ''
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= max_attempts:
+            email.status = OutboxEmail.FAILED
+            return
+        delay = min(
+            BACKOFF_BASE_SEC * 2 ** (email.attempts - 1), BACKOFF_MAX_SEC
+        )
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
@@ -0,0 +1,153 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from project import perf
+from project.dbrouters import use_replica
+
+logger = logging.getLogger('project.perf')
+
+# Cookie that pins client reads to primary database after a write
+PIN_PRIMARY_COOKIE = 'pin_primary'
+
+
+class PerformanceMiddleware:
+    """
+    Per-request instrumentation: DB queries count and time, cache
+    hits/misses and time, serialization and total time.
+    With PERF_VERBOSE metrics are sent in `Server-Timing` header and
+    logged as JSON line. Requests slower than PERF_SLOW_REQUEST_MS are
+    always logged (warning) with their SQL.
+    DB queries are recorded by perf.record_query wrapper.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = perf.RequestMetrics()
+        token = perf.activate(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            perf.deactivate(token)
+        return self.finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics = perf.RequestMetrics()
+        token = perf.activate(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            perf.deactivate(token)
+        return self.finish(request, response, metrics, started)
+
+    def finish(self, request, response, metrics, started):
+        total = time.perf_counter() - started
+        if settings.PERF_VERBOSE:
+            response['Server-Timing'] = self.server_timing(metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    @staticmethod
+    def server_timing(metrics, total):
+        timings = metrics.timings
+        counters = metrics.counters
+        return ', '.join([
+            f'db;dur={timings["db"] * 1000:.2f};desc="{counters["db"]} queries"',
+            f'cache;dur={timings["cache"] * 1000:.2f};'
+            f'desc="{counters["cache_hit"]} hits, {counters["cache_miss"]} misses"',
+            f'serialize;dur={timings["serialize"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+    @staticmethod
+    def log(request, response, metrics, total):
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_queries': metrics.counters['db'],
+            'db_ms': round(metrics.timings['db'] * 1000, 2),
+            'cache_hits': metrics.counters['cache_hit'],
+            'cache_misses': metrics.counters['cache_miss'],
+            'cache_ms': round(metrics.timings['cache'] * 1000, 2),
+            'serialize_ms': round(metrics.timings['serialize'] * 1000, 2),
+        }
+        if total * 1000 < settings.PERF_SLOW_REQUEST_MS:
+            logger.info(json.dumps(record))
+            return
+        record['slow'] = True
+        record['queries'] = [
+            {'sql': sql, 'ms': round(duration * 1000, 2)}
+            for sql, duration in metrics.queries
+        ]
+        logger.warning(json.dumps(record))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Safe requests read from the read replica, others from primary
+    (the default of project.dbrouters.PrimaryReplicaRouter).
+    After a successful write the client is pinned to primary for
+    REPLICA_LAG_TOLERANCE_SEC, so it always reads its own writes.
+    Works in both sync (WSGI) and async (ASGI) middleware chains.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with use_replica(self.reads_replica(request)):
+            response = self.get_response(request)
+        return self.finish(request, response)
+
+    async def __acall__(self, request):
+        with use_replica(self.reads_replica(request)):
+            response = await self.get_response(request)
+        return self.finish(request, response)
+
+    @staticmethod
+    def reads_replica(request):
+        """
+        Safe request of a client not pinned to primary.
+        """
+        return (
+            request.method in SAFE_METHODS
+            and PIN_PRIMARY_COOKIE not in request.COOKIES
+        )
+
+    def finish(self, request, response):
+        """
+        Pin client to primary after a successful write.
+        """
+        is_write = request.method not in SAFE_METHODS
+        if is_write and response.status_code < 400:
+            response.set_cookie(
+                PIN_PRIMARY_COOKIE,
+                '1',
+                max_age=settings.REPLICA_LAG_TOLERANCE_SEC,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
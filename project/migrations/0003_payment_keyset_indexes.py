@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0002_alter_payment_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['collect', '-timestamp', '-id'], name='payment_collect_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-timestamp', '-id'], name='payment_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['user', 'collect'], name='payment_user_collect_idx'),
+        ),
+    ]
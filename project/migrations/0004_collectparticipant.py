@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0003_payment_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectParticipant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('joined_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('collect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='donors', to='project.collect')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-joined_at'],
+                'indexes': [models.Index(fields=['collect', '-joined_at'], name='participant_collect_idx')],
+                'constraints': [models.UniqueConstraint(fields=('collect', 'user'), name='unique_collect_participant')],
+            },
+        ),
+    ]
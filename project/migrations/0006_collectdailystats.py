@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0005_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectparticipant',
+            name='last_paid_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='CollectDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('donors', models.PositiveIntegerField(default=0)),
+                ('collect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='project.collect')),
+            ],
+            options={
+                'ordering': ['collect', 'day'],
+                'indexes': [models.Index(fields=['day'], name='daily_stats_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('collect', 'day'), name='unique_collect_daily_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:50
+
+import django.db.models.deletion
+import project.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0006_collectdailystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectSearchIndex',
+            fields=[
+                ('collect', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='project.collect')),
+                ('title', models.TextField()),
+                ('description', models.TextField()),
+                ('document', project.models.FullTextField(db_column='project_collect_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'project_collect_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE project_collect_fts USING fts5(
+                    title,
+                    description,
+                    content='project_collect',
+                    content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+                """,
+                """
+                CREATE TRIGGER project_collect_fts_insert
+                AFTER INSERT ON project_collect BEGIN
+                    INSERT INTO project_collect_fts (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+                """,
+                """
+                CREATE TRIGGER project_collect_fts_delete
+                AFTER DELETE ON project_collect BEGIN
+                    INSERT INTO project_collect_fts
+                        (project_collect_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END
+                """,
+                """
+                CREATE TRIGGER project_collect_fts_update
+                AFTER UPDATE OF title, description ON project_collect BEGIN
+                    INSERT INTO project_collect_fts
+                        (project_collect_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO project_collect_fts (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+                """,
+                "INSERT INTO project_collect_fts (project_collect_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                "DROP TRIGGER project_collect_fts_update",
+                "DROP TRIGGER project_collect_fts_delete",
+                "DROP TRIGGER project_collect_fts_insert",
+                "DROP TABLE project_collect_fts",
+            ],
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:52
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0007_collectsearchindex'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(fields=['-created_at', '-id'], name='collect_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(fields=['purpose', '-created_at', '-id'], name='collect_purpose_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='collect_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(condition=models.Q(('ended_at__isnull', True)), fields=['-created_at', '-id'], name='collect_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(condition=models.Q(('ended_at__isnull', False)), fields=['-created_at', '-id'], name='collect_ended_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(fields=['-current_amount'], name='collect_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(models.OrderBy(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast('current_amount', models.FloatField()), '/', django.db.models.functions.comparison.Cast('target_amount', models.FloatField())), descending=True), name='collect_progress_idx'),
+        ),
+    ]
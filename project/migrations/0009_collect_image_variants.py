@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Search index triggers as created by 0007_collectsearchindex: SQLite
+# drops them with the collect table rebuilt below. Inlined, so this
+# migration does not depend on models code.
+SEARCH_INDEX_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS project_collect_fts_insert
+    AFTER INSERT ON project_collect BEGIN
+        INSERT INTO project_collect_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_collect_fts_delete
+    AFTER DELETE ON project_collect BEGIN
+        INSERT INTO project_collect_fts
+            (project_collect_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_collect_fts_update
+    AFTER UPDATE OF title, description ON project_collect BEGIN
+        INSERT INTO project_collect_fts
+            (project_collect_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO project_collect_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0008_collect_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # collect table is rebuilt by SQLite schema editor, its search
+    # index triggers are dropped with the old table
+    operations = [
+        migrations.RunSQL(
+            sql=migrations.RunSQL.noop,
+            reverse_sql=SEARCH_INDEX_TRIGGERS,
+        ),
+        migrations.AddField(
+            model_name='collect',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='collect',
+            name='image_variants_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='collect',
+            index=models.Index(condition=models.Q(('image_variants_pending', True)), fields=['id'], name='collect_image_pending_idx'),
+        ),
+        migrations.RunSQL(
+            sql=SEARCH_INDEX_TRIGGERS,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
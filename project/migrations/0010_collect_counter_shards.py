@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-16 21:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Search index triggers as created by 0007_collectsearchindex: SQLite
+# drops them with the collect table rebuilt below. Inlined, so this
+# migration does not depend on models code.
+SEARCH_INDEX_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS project_collect_fts_insert
+    AFTER INSERT ON project_collect BEGIN
+        INSERT INTO project_collect_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_collect_fts_delete
+    AFTER DELETE ON project_collect BEGIN
+        INSERT INTO project_collect_fts
+            (project_collect_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS project_collect_fts_update
+    AFTER UPDATE OF title, description ON project_collect BEGIN
+        INSERT INTO project_collect_fts
+            (project_collect_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO project_collect_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0009_collect_image_variants'),
+    ]
+
+    # collect table is rebuilt by SQLite schema editor, its search
+    # index triggers are dropped with the old table
+    operations = [
+        migrations.RunSQL(
+            sql=migrations.RunSQL.noop,
+            reverse_sql=SEARCH_INDEX_TRIGGERS,
+        ),
+        migrations.AddField(
+            model_name='collect',
+            name='counter_shards',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CollectCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('participants', models.IntegerField(default=0)),
+                ('collect', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='project.collect')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('collect', 'shard'), name='unique_collect_counter_shard')],
+            },
+        ),
+        migrations.RunSQL(
+            sql=SEARCH_INDEX_TRIGGERS,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0011_payment_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxemail',
+            name='claim_token',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('project', '0012_outboxemail_claim_token'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='collect',
+            name='collect_amount_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='collect',
+            name='collect_progress_idx',
+        ),
+    ]
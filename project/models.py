@@ -1,13 +1,23 @@
-from django.db import models, transaction
-from django.db.models import F
+import random
+import re
+import uuid
+from decimal import Decimal
+from functools import partial
+
+from django.db import connections, models, router, transaction
 from django.contrib.auth.models import User
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Cast, Coalesce
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from project.cache import bump_collect_version, update_leaderboards
+from project.images import delete_variants
+from project.stream import publish_payments
+
 
 class Payment(models.Model):
     """
@@ -19,6 +29,8 @@ class Payment(models.Model):
         - `collect` (string): payment purpose.
         - `amount` (number): payment amount (two decimal places).
         - `timestamp` (string, datetime): payment time (ISO format).
+        - `idempotency_key` (string): Idempotency-Key header of the pay
+          request, unique per user (see project.idempotency).
 
     Example:
     ```json
@@ -44,28 +56,293 @@ class Payment(models.Model):
         )
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     timestamp = models.DateTimeField(auto_now_add=True)
+    idempotency_key = models.CharField(
+        max_length=255,
+        null=True,
+        blank=True
+        )
 
     def __str__(self):
         return f"Payment of the user: {self.user.username} - {self.amount}"
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # collect feed: keyset pagination by (timestamp, id)
+            models.Index(
+                fields=['collect', '-timestamp', '-id'],
+                name='payment_collect_feed_idx'
+            ),
+            # payments list: keyset pagination by (timestamp, id)
+            models.Index(
+                fields=['-timestamp', '-id'],
+                name='payment_timestamp_idx'
+            ),
+            # "has user already paid into this collect" checks
+            models.Index(
+                fields=['user', 'collect'],
+                name='payment_user_collect_idx'
+            ),
+        ]
+        constraints = [
+            # retried pay request must not create a second payment
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_payment_idempotency_key'
+            ),
+        ]
+
+def get_payment_confirmation_email(payment):
+    """
+    Payment confirmation email as (subject, message, from_email, recipient_list).
+    """
+    subject = f"Payment Confirmation for {payment.collect.title}"
+    message = f"Thank you for your donation of {payment.amount} to {payment.collect.title}!"
+    return (
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        [payment.user.email],
+    )
+
 
 @receiver(post_save, sender=Payment)
 def send_payment_confirmation_email(sender, instance, created, **kwargs):
     """
-    Send payment confirmation email to the user after a new payment is created.
+    Queue payment confirmation email to the user after a new payment is created.
     """
     if created and instance.user and instance.user.email: # Check if user exists and has an email
-        subject = f"Payment Confirmation for {instance.collect.title}"
-        message = f"Thank you for your donation of {instance.amount} to {instance.collect.title}!"
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [instance.user.email],
-            fail_silently=True  # False in production to catch errors
+        OutboxEmail.enqueue([get_payment_confirmation_email(instance)])
+
+
+class CollectParticipant(models.Model):
+    """
+    Collect participant: user who paid into the collect at least once.
+
+    Fields:
+        - `id` (integer): unique participant id.
+        - `collect` (integer): collect id.
+        - `user` (integer): participant user id.
+        - `joined_at` (string, datetime): first payment time (ISO format).
+        - `last_paid_on` (string, date): day of the last payment, unique
+          donors of daily stats are counted by it.
+    """
+    collect = models.ForeignKey(
+        'Collect',
+        on_delete=models.CASCADE,
+        related_name='donors'
         )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='participations'
+        )
+    joined_at = models.DateTimeField(default=timezone.now)
+    last_paid_on = models.DateField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-joined_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['collect', 'user'],
+                name='unique_collect_participant'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['collect', '-joined_at'],
+                name='participant_collect_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Participant {self.user_id} of the collect {self.collect_id}"
+
+    @classmethod
+    def add(cls, collect_id, user_id, joined_at=None):
+        """
+        Insert participant if absent.
+        Return True if user is a new participant of the collect.
+        """
+        using = router.db_for_write(cls)
+        connection = connections[using]
+        joined_at = joined_at or timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {cls._meta.db_table}
+                    (collect_id, user_id, joined_at, last_paid_on)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (collect_id, user_id) DO NOTHING
+                """,
+                [
+                    collect_id,
+                    user_id,
+                    connection.ops.adapt_datetimefield_value(joined_at),
+                    connection.ops.adapt_datefield_value(
+                        timezone.localdate(joined_at)
+                    ),
+                ]
+            )
+            return cursor.rowcount == 1
+
+    @classmethod
+    def mark_paid(cls, collect_id, user_id, day):
+        """
+        Set participant last payment day.
+        Return True if it is the first payment of the participant that day.
+        """
+        using = router.db_for_write(cls)
+        return cls.objects.using(using).filter(
+            models.Q(last_paid_on__isnull=True) | models.Q(last_paid_on__lt=day),
+            collect_id=collect_id,
+            user_id=user_id,
+        ).update(last_paid_on=day) == 1
+
+    @classmethod
+    def add_donor(cls, collect_id, user_id, paid_at=None):
+        """
+        Register payment of the user.
+        Return (new participant, new donor of the day) pair.
+        """
+        paid_at = paid_at or timezone.now()
+        if cls.add(collect_id, user_id, paid_at):
+            return True, True
+        return False, cls.mark_paid(
+            collect_id, user_id, timezone.localdate(paid_at)
+        )
+
+
+class CollectDailyStats(models.Model):
+    """
+    Daily rollup of collect payments, updated with every payment,
+    so stats never aggregate the payments table.
+
+    Fields:
+        - `id` (integer): unique rollup id.
+        - `collect` (integer): collect id.
+        - `day` (string, date): payments day.
+        - `amount` (number): payments amount of the day.
+        - `payments` (number): payments count of the day.
+        - `donors` (number): unique donors of the day.
+    """
+    collect = models.ForeignKey(
+        'Collect',
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+        )
+    day = models.DateField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+    donors = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['collect', 'day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['collect', 'day'],
+                name='unique_collect_daily_stats'
+            ),
+        ]
+        indexes = [
+            # global stats: all collections by day
+            models.Index(fields=['day'], name='daily_stats_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats of the collect {self.collect_id} on {self.day}"
+
+    @classmethod
+    def add(cls, collect_id, day, amount, payments=1, donors=0):
+        """
+        Add payments to the collect rollup of the day (upsert).
+        """
+        using = router.db_for_write(cls)
+        connection = connections[using]
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (collect_id, day, amount, payments, donors)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (collect_id, day) DO UPDATE SET
+                    amount = {table}.amount + excluded.amount,
+                    payments = {table}.payments + excluded.payments,
+                    donors = {table}.donors + excluded.donors
+                """,
+                [
+                    collect_id,
+                    connection.ops.adapt_datefield_value(day),
+                    cls._meta.get_field('amount').get_db_prep_save(
+                        amount, connection
+                    ),
+                    payments,
+                    donors,
+                ]
+            )
+
+
+def group_by_day(payments):
+    """
+    (day, payments) pairs of the payments by local day of their
+    timestamp, oldest day first, payments in (timestamp, id) order.
+    """
+    days = {}
+    for payment in sorted(payments, key=lambda p: (p.timestamp, p.pk)):
+        days.setdefault(timezone.localdate(payment.timestamp), []).append(payment)
+    return sorted(days.items())
+
+
+def get_shard_counter_annotations(sharded_only=True):
+    """
+    Not folded amount and participants of collect counter shards
+    (NULL for collect without shards), see Collect.counter_shards.
+    Shards are summed only for collects in sharded counters mode, other
+    rows skip the subqueries; `sharded_only=False` also sums shards left
+    after the mode was switched off and not folded yet.
+    """
+    shards = CollectCounterShard.objects.filter(
+        collect=OuterRef('pk')
+    ).order_by().values('collect')
+    annotations = {
+        'shard_amount': Subquery(
+            shards.annotate(total=Sum('amount')).values('total')
+        ),
+        'shard_participants': Subquery(
+            shards.annotate(total=Sum('participants')).values('total')
+        ),
+    }
+    if sharded_only:
+        annotations = {
+            name: Case(When(counter_shards__gt=0, then=subquery), default=None)
+            for name, subquery in annotations.items()
+        }
+    return annotations
+
+
+def get_combined_amount_expression():
+    """
+    Collected amount with not folded counter shards, for filters and
+    ordering (needs get_shard_counter_annotations). Computed per row:
+    no index can hold it, `current_amount` is not indexed either, so
+    payments do not update an index no query reads.
+    """
+    return F('current_amount') + Coalesce(
+        'shard_amount', Decimal(0), output_field=models.DecimalField()
+    )
+
+
+def get_progress_expression(amount='current_amount'):
+    """
+    Collected part of the collect target amount (1 is reached),
+    NULL for collect without target. `amount` may be
+    get_combined_amount_expression().
+    """
+    return (
+        Cast(amount, models.FloatField())
+        / Cast('target_amount', models.FloatField())
+    )
 
 
 class Collect(models.Model):
@@ -84,6 +361,11 @@ class Collect(models.Model):
         - `created_at` (string, datetime): collect start.
         - `ended_at` (string, datetime): collect end.
         - `image` (image): collect image.
+        - `image_variants` (object): resized copies of the image,
+          {variant: {format: file name}} (see project.images).
+        - `image_variants_pending` (boolean): image waits for variants.
+        - `counter_shards` (number): sharded counters mode for hot
+          collects, number of counter shards (0 is off).
 
     Example:
         ```json
@@ -98,7 +380,13 @@ class Collect(models.Model):
             "participants": 148,
             "created_at": "2023-10-01T09:30:00Z",
             "ended_at": "2023-12-31T23:59:59Z",
-            "image": "/media/collects/lisas_wedding.jpg"
+            "image": "/media/collects/lisas_wedding.jpg",
+            "image_variants": {
+                "thumb": {
+                    "webp": "/media/collects/lisas_wedding_thumb.webp",
+                    "jpeg": "/media/collects/lisas_wedding_thumb.jpg"
+                }
+            }
             }
         ```
     """
@@ -135,9 +423,43 @@ class Collect(models.Model):
         null=True,
         blank=True
         )
+    image_variants = models.JSONField(default=dict, blank=True)
+    image_variants_pending = models.BooleanField(default=False)
+    counter_shards = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at', '-ended_at', '-target_amount']
+        # list filters and orderings
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='collect_created_idx'
+            ),
+            models.Index(
+                fields=['purpose', '-created_at', '-id'],
+                name='collect_purpose_created_idx'
+            ),
+            models.Index(
+                fields=['author', '-created_at', '-id'],
+                name='collect_author_created_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(ended_at__isnull=True),
+                name='collect_active_created_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(ended_at__isnull=False),
+                name='collect_ended_created_idx'
+            ),
+            # image variants queue
+            models.Index(
+                fields=['id'],
+                condition=models.Q(image_variants_pending=True),
+                name='collect_image_pending_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"Collect: {self.title} by {self.author} for {self.target_amount}"
@@ -162,55 +484,546 @@ class Collect(models.Model):
     #         fail_silently=True
     #         )
 
-    def add_payment(self, user, amount):
+    def drop_image_variants(self):
+        """
+        Image is replaced or removed: forget variants of the old image,
+        their files are deleted after commit.
+        """
+        variants = self.image_variants
+        self.image_variants = {}
+        self.image_variants_pending = False
+        if variants:
+            storage = self.image.storage
+            transaction.on_commit(partial(delete_variants, storage, variants))
+
+    def add_payment(self, user, amount, idempotency_key=None):
         """
         Add new payment.
+        `idempotency_key` of the pay request is stored with it: the same
+        key of the user raises IntegrityError.
         Amount added to current amount.
         New participant added to participants.
         If current amount reached target amount, collect had finished.
+        Collect row is changed by one statement only (see apply_payments),
+        so the write lock is held for the shortest possible time.
         """
         with transaction.atomic():  # create atomic transaction
-            collect = Collect.objects.select_for_update().get(pk=self.pk)
             payment = Payment.objects.create(
                 user=user,
                 collect=self,
-                amount=amount
+                amount=amount,
+                idempotency_key=idempotency_key
             )
-            # add new payment amount into current_amount
-            Collect.objects.filter(pk=self.pk).update(
-                current_amount=F('current_amount') + amount
+            # user is a new participant on the first payment only
+            is_new_participant, is_new_donor = False, False
+            if user is not None:
+                is_new_participant, is_new_donor = CollectParticipant.add_donor(
+                    self.pk, user.pk, payment.timestamp
+                )
+            CollectDailyStats.add(
+                self.pk,
+                timezone.localdate(payment.timestamp),
+                amount,
+                donors=int(is_new_donor),
             )
-            # create queryset of all user payments and exclude current payment
-            # check if user already had paid into this collect.
-            previous_payments = Payment.objects.filter(
-                user=user,
-                collect=self
-            ).exclude(pk=payment.pk)
-            # if user didnot have pay before add 1 to participants
-            if not previous_payments.exists():
-                Collect.objects.filter(pk=self.pk).update(
-                    participants=F('participants') + 1
-                    )
-            collect.refresh_from_db()
-            # check if target reached after payment
-            if (collect.target_amount and collect.current_amount >= collect.target_amount and not collect.ended_at):
-                Collect.objects.filter(pk=self.pk).update(ended_at=timezone.now())
-                collect.ended_at = timezone.now()
+            self.apply_payments(
+                amount, int(is_new_participant), user and user.pk, [payment]
+            )
+            transaction.on_commit(lambda: publish_payments(self, [payment]))
             return payment
 
+    @classmethod
+    def add_payments(cls, user, items):
+        """
+        Add many payments of the user at once.
+        `items` is a list of (collect, amount) pairs.
+        Payments are inserted by one bulk query, then each affected
+        collect is updated once (in primary key order) with summed amount
+        and participant, daily stats once per payments day.
+        post_save is not sent for bulk payments: confirmation emails
+        are queued in one batch.
+        """
+        with transaction.atomic():
+            payments = Payment.objects.bulk_create(
+                Payment(user=user, collect=collect, amount=amount)
+                for collect, amount in items
+            )
+            by_collect = {}
+            for payment in payments:
+                by_collect.setdefault(
+                    payment.collect_id, (payment.collect, [])
+                )[1].append(payment)
+            # collect rows are locked in one order by all batches
+            for collect_id in sorted(by_collect):
+                collect, collect_payments = by_collect[collect_id]
+                is_new_participant = False
+                for day, day_payments in group_by_day(collect_payments):
+                    is_new_donor = False
+                    if user is not None:
+                        is_new_day_participant, is_new_donor = (
+                            CollectParticipant.add_donor(
+                                collect.pk, user.pk, day_payments[0].timestamp
+                            )
+                        )
+                        is_new_participant |= is_new_day_participant
+                    CollectDailyStats.add(
+                        collect.pk,
+                        day,
+                        sum(payment.amount for payment in day_payments),
+                        payments=len(day_payments),
+                        donors=int(is_new_donor),
+                    )
+                collect.apply_payments(
+                    sum(payment.amount for payment in collect_payments),
+                    int(is_new_participant),
+                    user and user.pk,
+                    collect_payments
+                )
+                transaction.on_commit(
+                    partial(publish_payments, collect, collect_payments)
+                )
+
+            if user is not None and user.email:
+                OutboxEmail.enqueue([
+                    get_payment_confirmation_email(payment)
+                    for payment in payments
+                ])
+        return payments
+
+    def apply_payments(self, amount, new_participants, user_id=None,
+                       payments=()):
+        """
+        Add payments amount and new participants to collect counters
+        (or to a counter shard, see apply_sharded_payments) and finish
+        collect if target amount reached. Finished collect ends at the
+        time of the payment that reached its target (one of `payments`).
+        Fresh counters are set on self.
+        Version and leaderboards are updated after commit, `user_id`
+        is the payer for top donors.
+        """
+        using = router.db_for_write(Collect)
+        payments = sorted(
+            payments, key=lambda payment: (payment.timestamp, payment.pk)
+        )
+        if self.counter_shards:
+            self.apply_sharded_payments(
+                amount, new_participants, using, payments
+            )
+        else:
+            finished_at = payments[-1].timestamp if payments else None
+            collect = self.update_counters(
+                amount, new_participants, using, finished_at
+            )
+            self.current_amount = collect.current_amount
+            self.participants = collect.participants
+            self.ended_at = collect.ended_at
+            if len(payments) > 1 and collect.ended_at == finished_at:
+                self.finish_by_payment(
+                    payments, collect.current_amount - amount, using
+                )
+        transaction.on_commit(
+            lambda: self.payments_committed(user_id, amount), using=using
+        )
+
+    def finish_by_payment(self, payments, amount_before, using):
+        """
+        Collect was finished at the time of the last of `payments`:
+        move its end to the payment that reached target amount.
+        """
+        total = amount_before
+        for payment in payments:
+            total += Decimal(str(payment.amount))
+            if total >= self.target_amount:
+                break
+        else:
+            return
+        if payment.timestamp != self.ended_at:
+            Collect.objects.using(using).filter(
+                pk=self.pk, ended_at=self.ended_at
+            ).update(ended_at=payment.timestamp)
+            self.ended_at = payment.timestamp
+
+    def update_counters(self, amount, new_participants, using,
+                        finished_at=None):
+        """
+        Add amount and new participants to collect counters and finish
+        collect at `finished_at` (now by default) if target amount
+        reached, all in one conditional UPDATE.
+        Return collect with fresh counters.
+        """
+        connection = connections[using]
+        finished_at = finished_at or timezone.now()
+        sql = f"""
+            UPDATE {Collect._meta.db_table} SET
+                current_amount = current_amount + %s,
+                participants = participants + %s,
+                ended_at = CASE
+                    WHEN ended_at IS NULL
+                        AND target_amount IS NOT NULL
+                        AND current_amount + %s >= target_amount
+                    THEN %s
+                    ELSE ended_at
+                END
+            WHERE id = %s
+        """
+        params = [
+            amount,
+            new_participants,
+            amount,
+            connection.ops.adapt_datetimefield_value(finished_at),
+            self.pk,
+        ]
+        if connection.features.can_return_columns_from_insert:
+            sql += " RETURNING id, current_amount, participants, ended_at"
+            collect = next(iter(
+                Collect.objects.raw(sql, params, using=using)
+            ))
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+            collect = Collect.objects.using(using).only(
+                'current_amount', 'participants', 'ended_at'
+            ).get(pk=self.pk)
+        return collect
+
+    def apply_sharded_payments(self, amount, new_participants, using,
+                               payments=()):
+        """
+        Sharded counters mode: payments go to a random counter shard,
+        so concurrent payments into a hot collect do not queue for the
+        lock of its row. Collect row is written only to finish collect
+        whose combined amount reached target, at the time of the payment
+        that reached it. Combined counters are set on self.
+        """
+        CollectCounterShard.add(
+            self.pk,
+            random.randrange(self.counter_shards),
+            amount,
+            new_participants,
+        )
+        collect = Collect.objects.using(using).annotate(
+            **get_shard_counter_annotations()
+        ).only(
+            'current_amount', 'participants', 'target_amount', 'ended_at'
+        ).get(pk=self.pk)
+        self.current_amount, self.participants = collect.get_combined_counters()
+        # counters of self include shards already
+        self.shard_amount = self.shard_participants = None
+        self.ended_at = collect.ended_at
+        if (self.ended_at is None
+                and collect.target_amount is not None
+                and self.current_amount >= collect.target_amount):
+            finished_at = payments[-1].timestamp if payments else timezone.now()
+            if Collect.objects.using(using).filter(
+                pk=self.pk, ended_at__isnull=True
+            ).update(ended_at=finished_at):
+                self.ended_at = finished_at
+                if len(payments) > 1:
+                    self.finish_by_payment(
+                        payments, self.current_amount - amount, using
+                    )
+
+    def get_combined_counters(self):
+        """
+        (amount, participants) of the collect with its not folded
+        counter shards (annotated by get_shard_counter_annotations).
+        """
+        return (
+            self.current_amount + (getattr(self, 'shard_amount', None) or 0),
+            self.participants + (getattr(self, 'shard_participants', None) or 0),
+        )
+
+    @classmethod
+    def fold_counter_shards(cls, collect_id):
+        """
+        Move values of collect counter shards to collect counters and
+        finish collect if target amount reached. Shards are decreased
+        by the moved values, so payments added meanwhile stay in them.
+        Return (moved amount, collect finished).
+        """
+        using = router.db_for_write(cls)
+        with transaction.atomic(using=using):
+            shards = list(CollectCounterShard.objects.using(using).filter(
+                collect_id=collect_id
+            ).exclude(amount=0, participants=0))
+            if not shards:
+                return 0, False
+            for shard in shards:
+                CollectCounterShard.objects.using(using).filter(
+                    pk=shard.pk
+                ).update(
+                    amount=F('amount') - shard.amount,
+                    participants=F('participants') - shard.participants,
+                )
+            amount = sum(shard.amount for shard in shards)
+            participants = sum(shard.participants for shard in shards)
+            ended_at = cls.objects.using(using).values_list(
+                'ended_at', flat=True
+            ).get(pk=collect_id)
+            collect = cls(pk=collect_id).update_counters(
+                amount, participants, using
+            )
+            finished = ended_at is None and collect.ended_at is not None
+            if finished:
+                # fresh version and leaderboards: collect is finished
+                collect = cls.objects.using(using).annotate(
+                    **get_shard_counter_annotations(sharded_only=False)
+                ).get(pk=collect_id)
+                collect.current_amount, collect.participants = (
+                    collect.get_combined_counters()
+                )
+                transaction.on_commit(
+                    partial(collect.payments_committed, None, 0), using=using
+                )
+        return amount, finished
+
+    def payments_committed(self, user_id, amount):
+        """
+        Payments committed: new collect version, fresh leaderboards.
+        """
+        bump_collect_version(self.pk)
+        update_leaderboards(self, user_id, amount, only_greater=True)
+
+
+class CollectCounterShard(models.Model):
+    """
+    Counter shard of a hot collect (sharded counters mode, see
+    Collect.counter_shards): payments add to a random shard instead of
+    the collect row, `fold_counter_shards` command moves shard values
+    to the collect counters.
+
+    Fields:
+        - `id` (integer): unique shard id.
+        - `collect` (integer): collect id.
+        - `shard` (number): shard number, from 0 to counter_shards - 1.
+        - `amount` (number): amount not folded yet.
+        - `participants` (number): new participants not folded yet.
+    """
+    collect = models.ForeignKey(
+        Collect,
+        on_delete=models.CASCADE,
+        related_name='shards'
+        )
+    shard = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    participants = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['collect', 'shard'],
+                name='unique_collect_counter_shard'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Counter shard {self.shard} of the collect {self.collect_id}"
+
+    @classmethod
+    def add(cls, collect_id, shard, amount, participants=0):
+        """
+        Add payments to the collect counter shard (upsert).
+        """
+        using = router.db_for_write(cls)
+        connection = connections[using]
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (collect_id, shard, amount, participants)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (collect_id, shard) DO UPDATE SET
+                    amount = {table}.amount + excluded.amount,
+                    participants = {table}.participants + excluded.participants
+                """,
+                [
+                    collect_id,
+                    shard,
+                    cls._meta.get_field('amount').get_db_prep_save(
+                        amount, connection
+                    ),
+                    participants,
+                ]
+            )
+
+
+class FullTextField(models.TextField):
+    """
+    Hidden column of SQLite FTS5 table named as the table itself:
+    filtering by it with `match` searches all indexed columns.
+    """
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+class CollectSearchIndex(models.Model):
+    """
+    Full-text search index of collect title and description.
+    SQLite FTS5 table with collect table as external content, kept in
+    sync by triggers on collect insert, update and delete (created by
+    migration, the table is not managed by Django).
+    SQLite drops the triggers with collect table: migrations rebuilding
+    it (most AddField and AlterField ones) must create them again, as
+    0009 and 0010 do. SearchIndexTriggersTests fail if they do not.
+
+    Fields:
+        - `collect` (integer): collect id (FTS rowid).
+        - `title` (string): indexed collect title.
+        - `description` (string): indexed collect description.
+        - `document` (string): whole row, for `match` lookup.
+        - `rank` (number): match relevance, lower is better.
+    """
+    collect = models.OneToOneField(
+        Collect,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index'
+        )
+    title = models.TextField()
+    description = models.TextField()
+    document = FullTextField(db_column='project_collect_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'project_collect_fts'
+
+    @staticmethod
+    def build_query(text):
+        """
+        FTS5 query from user input: words are quoted, so FTS syntax
+        is never interpreted, and the last one is a prefix (search as
+        you type). Empty string if there are no words.
+        """
+        words = re.findall(r'\w+', text)
+        if not words:
+            return ''
+        return ' '.join(f'"{word}"' for word in words) + '*'
+
+
 @receiver(post_save, sender=Collect)
 def send_creation_email_on_collect_creation(sender, instance, created, **kwargs):
     """
-    Send success email to author after Collect instance is created.
+    Queue success email to author after Collect instance is created.
     """
     if created and instance.author.email:
         subject = f"Collect '{instance.title}' created successfully"
         message = f"You created collect '{instance.title}'. Target: {instance.target_amount}."
         # add doctring and URl to collect
-        send_mail(
+        OutboxEmail.enqueue([(
             subject,
             message,
             settings.DEFAULT_FROM_EMAIL,
             [instance.author.email],
-            fail_silently=True
+        )])
+
+
+class OutboxEmail(models.Model):
+    """
+    Outgoing email: written after commit of the transaction that
+    caused it and sent by `send_outbox_emails` worker, so requests
+    never wait for SMTP.
+
+    Fields:
+        - `id` (integer): unique email id.
+        - `subject` (string): email subject.
+        - `message` (string): email body.
+        - `from_email` (string): sender address.
+        - `recipient` (string): recipient address.
+        - `status` (string): one from the STATUS_CHOICES.
+        - `attempts` (number): failed sending attempts.
+        - `next_attempt_at` (string, datetime): not sent before this time,
+          claimed email is not sent by others before its lease ends.
+        - `claim_token` (string): token of the worker sending the email.
+        - `last_error` (string): last sending error.
+        - `created_at` (string, datetime): email queued.
+        - `sent_at` (string, datetime): email sent.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    ]
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipient = models.EmailField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING
+        )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='outbox_pending_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Email to {self.recipient}: {self.subject} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, emails):
+        """
+        Queue emails after current transaction commit.
+        `emails` are (subject, message, from_email, recipient_list)
+        tuples, as for `send_mass_mail`.
+        """
+        outbox = [
+            cls(
+                subject=subject,
+                message=message,
+                from_email=from_email,
+                recipient=recipient,
+            )
+            for subject, message, from_email, recipient_list in emails
+            for recipient in recipient_list
+        ]
+        transaction.on_commit(lambda: cls.objects.bulk_create(outbox))
+
+    @classmethod
+    def claim(cls, batch_size, lease):
+        """
+        Claim up to `batch_size` due emails for one worker and return them.
+        Emails are taken by one conditional UPDATE with a new claim token:
+        rows claimed by another worker meanwhile are not due any more.
+        They are not due until `lease` (timedelta) ends either, so emails
+        of a crashed worker are sent again after it.
+        """
+        now = timezone.now()
+        due = cls.objects.filter(status=cls.PENDING, next_attempt_at__lte=now)
+        ids = list(due.order_by('next_attempt_at').values_list(
+            'pk', flat=True
+        )[:batch_size])
+        if not ids:
+            return []
+        token = uuid.uuid4().hex
+        due.filter(pk__in=ids).update(
+            claim_token=token, next_attempt_at=now + lease
         )
+        return list(cls.objects.filter(
+            pk__in=ids, claim_token=token
+        ).order_by('id'))
@@ -0,0 +1,197 @@
+from base64 import b64decode, b64encode
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework import pagination
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class PageNumberPagination(pagination.PageNumberPagination):
+    """
+    DRF page number pagination with async views support.
+    """
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async `paginate_queryset`: COUNT and page are read by async ORM.
+        Django paginator works on positions (`range`) only.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        count = await queryset.acount()
+        paginator = self.django_paginator_class(range(count), page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        positions = self.page.object_list
+        self.page.object_list = [
+            item async for item in queryset[positions.start:positions.stop]
+        ]
+        return self.page.object_list
+
+
+class PaymentCursorPagination(BasePagination):
+    """
+    Keyset pagination for payments: newest first by (timestamp, id).
+
+    Cursor holds the position of the last returned payment, next page
+    is fetched with `WHERE (timestamp, id) < position LIMIT page_size`.
+    No COUNT(*) and no OFFSET: every page costs the same.
+    """
+    cursor_query_param = 'cursor'
+    cursor_query_description = _('The pagination cursor value.')
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = _('Invalid cursor')
+    ordering = ('-timestamp', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async `paginate_queryset`: page is read by async ORM.
+        """
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([item async for item in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Page of the request cursor with one extra row: next page check.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = self.filter_after(queryset, *position)
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def set_page(self, results):
+        """
+        Trim fetched page, remember next page position.
+        """
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            self.next_position = (results[-1].timestamp, results[-1].pk)
+        return results
+
+    def paginate_cached(self, payments, complete, request):
+        """
+        Page over already serialized payments (newest first).
+        Return None if cached payments end before the page does and
+        older payments have to be read from DB.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_cursor(request)
+        start = 0
+        if position is not None:
+            start = len(payments)
+            for index, payment in enumerate(payments):
+                if self.get_position(payment) < position:
+                    start = index
+                    break
+        results = payments[start:start + self.page_size + 1]
+        self.has_next = len(results) > self.page_size
+        if not self.has_next and not complete:
+            return None
+        results = results[:self.page_size]
+        self.next_position = None
+        if self.has_next:
+            self.next_position = self.get_position(results[-1])
+        return results
+
+    @staticmethod
+    def get_position(payment):
+        """
+        (timestamp, id) position of serialized payment.
+        """
+        return parse_datetime(payment['timestamp']), payment['id']
+
+    @staticmethod
+    def filter_after(queryset, timestamp, pk):
+        """
+        Payments placed after (timestamp, id) in the feed order.
+        """
+        return queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk),
+            timestamp__lte=timestamp,
+        )
+
+    def decode_cursor(self, request):
+        """
+        Return (timestamp, id) position from request cursor or None.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            decoded = b64decode(encoded.encode('ascii')).decode('ascii')
+            timestamp, pk = decoded.rsplit('|', 1)
+            timestamp = parse_datetime(timestamp)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+    def encode_cursor(self, timestamp, pk):
+        """
+        Return url with encoded (timestamp, id) position.
+        """
+        position = f'{timestamp.isoformat()}|{pk}'
+        encoded = b64encode(position.encode('ascii')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(*self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': str(self.cursor_query_description),
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,113 @@
+"""
+Per-request performance metrics: DB queries, cache, serialization time.
+Metrics of the current request are collected by PerformanceMiddleware.
+Metrics are kept in a context variable, so they follow the request into
+sync_to_async threads (async views, async ORM).
+"""
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Max SQL statements kept for the slow request log
+MAX_LOGGED_QUERIES = 50
+
+_metrics = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """
+    Timings (seconds) and counters collected during one request.
+    """
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counters = defaultdict(int)
+        self.queries = []
+        self.running = set()
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        DB execute wrapper: query count, time and SQL.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.timings['db'] += duration
+            self.counters['db'] += 1
+            if len(self.queries) < MAX_LOGGED_QUERIES:
+                self.queries.append((sql, duration))
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    DB execute wrapper of every connection: queries of a request go
+    to its metrics. Async ORM runs queries on connections of worker
+    threads, so wrapper can not be installed by the request itself.
+    """
+    metrics = current()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    `connection_created` receiver: install `record_query` wrapper.
+    It goes first, so `execute_wrapper()` blocks never remove it.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def activate(metrics):
+    return _metrics.set(metrics)
+
+
+def deactivate(token):
+    _metrics.reset(token)
+
+
+def current():
+    """
+    Metrics of the current request or None outside of request.
+    """
+    return _metrics.get()
+
+
+@contextmanager
+def timer(name):
+    """
+    Add block time to the `name` timing of current request.
+    Nested timers with the same name are counted once (outermost).
+    """
+    metrics = current()
+    if metrics is None or name in metrics.running:
+        yield
+        return
+    metrics.running.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.timings[name] += time.perf_counter() - started
+        metrics.running.discard(name)
+
+
+def count(name, value=1):
+    """
+    Increase `name` counter of current request.
+    """
+    metrics = current()
+    if metrics is not None:
+        metrics.counters[name] += value
+
+
+class TimedSerializerMixin:
+    """
+    Serializer mixin: representation time goes to `serialize` timing.
+    """
+    def to_representation(self, instance):
+        with timer('serialize'):
+            return super().to_representation(instance)
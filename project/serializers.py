@@ -1,9 +1,27 @@
+from datetime import timedelta
+
 from rest_framework import serializers
-from project.models import Collect, Payment
+from project.models import (
+    Collect,
+    CollectDailyStats,
+    CollectParticipant,
+    Payment,
+    )
+from project.perf import TimedSerializerMixin
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+# Max payments in one bulk payment request
+BULK_PAYMENTS_MAX_ITEMS = 1000
+# Stats period: default and max number of days
+STATS_DEFAULT_DAYS = 30
+STATS_MAX_DAYS = 366
+# Leaderboard size: default and max
+LEADERBOARD_DEFAULT_LIMIT = 10
+LEADERBOARD_MAX_LIMIT = 100
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     User serializer.
     """
@@ -12,7 +30,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -26,7 +44,18 @@ class PaymentSerializer(serializers.ModelSerializer):
         ]
 
 
-class CollectSerializer(serializers.ModelSerializer):
+class CollectParticipantSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Collect participant (donor) serializer.
+    """
+    user = UserSerializer(read_only=True)
+
+    class Meta:
+        model = CollectParticipant
+        fields = ['user', 'joined_at']
+
+
+class CollectSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Collect serializer.
     """
@@ -34,6 +63,7 @@ class CollectSerializer(serializers.ModelSerializer):
     payments = PaymentSerializer(many=True, read_only=True)
     participants = serializers.IntegerField(read_only=True)
     limit_status = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     def get_limit_status(self, obj):
         """
@@ -43,16 +73,200 @@ class CollectSerializer(serializers.ModelSerializer):
             return 'Unlimited'
         return f'Target: {obj.target_amount}'
 
+    def get_image_variants(self, obj):
+        """
+        Resized image URLs: {variant: {format: url}}, empty until
+        variants are generated by the worker.
+        """
+        storage = obj.image.storage
+        request = self.context.get('request')
+        variants = {}
+        for variant, formats in obj.image_variants.items():
+            variants[variant] = {}
+            for fmt, name in formats.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[variant][fmt] = url
+        return variants
+
+    def to_representation(self, instance):
+        """
+        Counters of collect in sharded counters mode include its not
+        folded counter shards (annotated by the viewset).
+        """
+        data = super().to_representation(instance)
+        if getattr(instance, 'shard_amount', None) is not None:
+            amount, participants = instance.get_combined_counters()
+            data['current_amount'] = self.fields[
+                'current_amount'
+            ].to_representation(amount)
+            data['participants'] = participants
+        return data
+
     class Meta:
         model = Collect
         fields = [
             'id', 'author', 'title', 'purpose',
             'description', 'target_amount', 'current_amount',
             'participants', 'created_at', 'ended_at', 'image',
-            'limit_status', 'payments'
+            'image_variants', 'limit_status', 'payments'
+        ]
+
+
+class CollectListSerializer(CollectSerializer):
+    """
+    Compact collect serializer for list views: no embedded payments.
+    """
+    payments = None
+    recent_payments_count = serializers.IntegerField(read_only=True, default=0)
+    progress = serializers.FloatField(read_only=True, default=None)
+
+    class Meta(CollectSerializer.Meta):
+        fields = [
+            'id', 'author', 'title', 'purpose',
+            'description', 'target_amount', 'current_amount',
+            'participants', 'created_at', 'ended_at', 'image',
+            'image_variants', 'limit_status', 'recent_payments_count',
+            'progress'
         ]
 
 
+class CollectFilterSerializer(serializers.Serializer):
+    """
+    Collect list filters (query params).
+    `status`: active (not finished) or ended collects.
+    `min_progress`, `max_progress`: collected part of the target
+    amount, collects without target are excluded by them.
+    """
+    STATUS_CHOICES = ['active', 'ended']
+
+    purpose = serializers.ChoiceField(
+        choices=Collect.PURPOSE_CHOICES,
+        required=False
+    )
+    status = serializers.ChoiceField(choices=STATUS_CHOICES, required=False)
+    author = serializers.IntegerField(required=False)
+    min_progress = serializers.FloatField(min_value=0, required=False)
+    max_progress = serializers.FloatField(min_value=0, required=False)
+
+
+class BulkPaymentItemSerializer(serializers.Serializer):
+    """
+    Single payment of the bulk payment request.
+    """
+    collect = serializers.IntegerField()
+    amount = serializers.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=0
+    )
+
+
+class BulkPaymentSerializer(serializers.Serializer):
+    """
+    Bulk payment serializer: many payments into one or many collects.
+    """
+    payments = BulkPaymentItemSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=BULK_PAYMENTS_MAX_ITEMS
+    )
+
+    def validate_payments(self, items):
+        """
+        Check all collects exist by one query.
+        Return list of (collect, amount) pairs.
+        """
+        collect_ids = {item['collect'] for item in items}
+        collects = Collect.objects.in_bulk(collect_ids)
+        missing = sorted(collect_ids - collects.keys())
+        if missing:
+            raise serializers.ValidationError(
+                f"Collects not found: {', '.join(map(str, missing))}"
+            )
+        return [(collects[item['collect']], item['amount']) for item in items]
+
+
+class StatsPeriodSerializer(serializers.Serializer):
+    """
+    Stats period query params: `since` and `until` days, inclusive.
+    Last STATS_DEFAULT_DAYS days by default.
+    """
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+
+    def validate(self, data):
+        until = data.get('until') or timezone.localdate()
+        since = data.get('since') or until - timedelta(days=STATS_DEFAULT_DAYS - 1)
+        if since > until:
+            raise serializers.ValidationError("`since` must not be after `until`")
+        if (until - since).days >= STATS_MAX_DAYS:
+            raise serializers.ValidationError(
+                f"Stats period must not exceed {STATS_MAX_DAYS} days"
+            )
+        return {'since': since, 'until': until}
+
+
+class DailyStatsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Collect daily rollup serializer.
+    """
+    class Meta:
+        model = CollectDailyStats
+        fields = ['day', 'amount', 'payments', 'donors']
+
+
+class StatsTotalSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Payments amount and count of stats group.
+    """
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    payments = serializers.IntegerField()
+
+
+class DayStatsSerializer(StatsTotalSerializer):
+    day = serializers.DateField()
+
+
+class PurposeStatsSerializer(StatsTotalSerializer):
+    purpose = serializers.ChoiceField(choices=Collect.PURPOSE_CHOICES)
+
+
+class LeaderboardQuerySerializer(serializers.Serializer):
+    """
+    Leaderboard query params: number of entries.
+    """
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=LEADERBOARD_MAX_LIMIT,
+        default=LEADERBOARD_DEFAULT_LIMIT
+    )
+
+
+class CollectRankSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """
+    Collect leaderboard entry: compact collect and its score
+    (amount or progress toward target).
+    """
+    score = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Collect
+        fields = [
+            'id', 'title', 'purpose', 'target_amount',
+            'current_amount', 'participants', 'ended_at', 'score'
+        ]
+
+
+class DonorRankSerializer(TimedSerializerMixin, serializers.Serializer):
+    """
+    Top donors entry: user and total amount paid into the collect.
+    """
+    user = UserSerializer(read_only=True)
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """
     User registration serializer.
@@ -0,0 +1,251 @@
+"""
+Real-time collect events: payments are published to Redis pub/sub
+after commit and pushed to clients of the collect stream (Server-Sent
+Events). Every worker process keeps one Redis subscription connection
+shared by all its clients, clients are asyncio queues, not threads.
+Without Redis cache (dev, tests) events are passed in-process.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from decimal import Decimal
+
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from project.cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Comment line sent to idle clients, keeps proxies from closing them (sec)
+STREAM_KEEPALIVE_SEC = 15
+# Client reconnection delay sent to EventSource (ms)
+STREAM_RETRY_MS = 3000
+# Events waiting for a slow client, newer ones are dropped
+STREAM_QUEUE_SIZE = 100
+
+
+def get_collect_stream_channel(collect_id):
+    "Return pub/sub channel of collect events"
+    return f"collect_stream_{collect_id}"
+
+
+def format_amount(amount):
+    """
+    Amount as in API responses: string with two decimal places.
+    """
+    if amount is None:
+        return None
+    return f"{Decimal(amount):.2f}"
+
+
+def get_collect_state(collect):
+    """
+    Collect counters sent to stream clients.
+    """
+    return {
+        "id": collect.pk,
+        "target_amount": format_amount(collect.target_amount),
+        "current_amount": format_amount(collect.current_amount),
+        "participants": collect.participants,
+        "ended_at": collect.ended_at,
+    }
+
+
+def get_payments_event(collect, payments):
+    """
+    New payments of the collect and its fresh counters.
+    """
+    return {
+        "collect": get_collect_state(collect),
+        "payments": [
+            {
+                "id": payment.pk,
+                "user": payment.user and {
+                    "id": payment.user.pk,
+                    "username": payment.user.username,
+                },
+                "amount": format_amount(payment.amount),
+                "timestamp": payment.timestamp,
+            }
+            for payment in payments
+        ],
+    }
+
+
+def format_event(event, data):
+    """
+    Server-Sent Events message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
+
+
+def offer(queue, message):
+    """
+    Put message to client queue, slow client misses it: the next
+    event brings fresh counters anyway.
+    """
+    if not queue.full():
+        queue.put_nowait(message)
+
+
+class Broker:
+    """
+    Fan-out of channel messages to local subscribers: asyncio queues
+    with their event loops, so messages can be published from any
+    thread (sync views, after commit callbacks).
+    """
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    async def join(self, channel):
+        """
+        First local subscriber of the channel.
+        """
+
+    async def leave(self, channel):
+        """
+        Last local subscriber of the channel left.
+        """
+
+    def dispatch(self, channel, message):
+        for loop, queue in list(self.subscribers.get(channel, ())):
+            loop.call_soon_threadsafe(offer, queue, message)
+
+    def close_all(self):
+        """
+        Finish all streams (None message), clients reconnect.
+        """
+        for channel in list(self.subscribers):
+            self.dispatch(channel, None)
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        """
+        Queue of the channel messages, None means end of stream.
+        """
+        subscriber = (
+            asyncio.get_running_loop(),
+            asyncio.Queue(maxsize=STREAM_QUEUE_SIZE),
+        )
+        subscribers = self.subscribers[channel]
+        subscribers.add(subscriber)
+        try:
+            if len(subscribers) == 1:
+                await self.join(channel)
+            yield subscriber[1]
+        finally:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self.subscribers.pop(channel, None)
+                await self.leave(channel)
+
+
+class LocalBroker(Broker):
+    """
+    In-process pub/sub: one process only (dev server, tests).
+    """
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+
+class RedisBroker(Broker):
+    """
+    Redis pub/sub: one subscription connection per process,
+    channels are subscribed while they have local subscribers.
+    """
+    def __init__(self):
+        super().__init__()
+        self.pubsub = None
+        self.reader = None
+        # Redis channel (cache key) -> channel
+        self.channels = {}
+
+    def publish(self, channel, message):
+        get_redis().publish(cache.make_key(channel), message)
+
+    def connect(self):
+        client = redis.asyncio.from_url(settings.CACHES["default"]["LOCATION"])
+        return client.pubsub(ignore_subscribe_messages=True)
+
+    async def join(self, channel):
+        if self.pubsub is None:
+            self.pubsub = self.connect()
+        key = cache.make_key(channel)
+        self.channels[key.encode()] = channel
+        await self.pubsub.subscribe(key)
+        if self.reader is None or self.reader.done():
+            self.reader = asyncio.create_task(self.read(self.pubsub))
+
+    async def leave(self, channel):
+        key = cache.make_key(channel)
+        self.channels.pop(key.encode(), None)
+        if self.pubsub is not None:
+            await self.pubsub.unsubscribe(key)
+
+    async def read(self, pubsub):
+        """
+        Dispatch Redis messages while there are subscribed channels.
+        Lost connection finishes all streams.
+        """
+        try:
+            async for message in pubsub.listen():
+                channel = self.channels.get(message["channel"])
+                if channel is not None:
+                    self.dispatch(channel, message["data"].decode())
+        except (redis.RedisError, OSError):
+            logger.exception("Collect stream subscription failed")
+            self.pubsub = None
+            await pubsub.aclose()
+            self.close_all()
+
+
+_brokers = {}
+
+
+def get_broker():
+    """
+    Pub/sub broker of the process: Redis or in-process one.
+    """
+    broker_class = LocalBroker if get_redis() is None else RedisBroker
+    if broker_class not in _brokers:
+        _brokers[broker_class] = broker_class()
+    return _brokers[broker_class]
+
+
+def publish_payments(collect, payments):
+    """
+    Publish committed payments of the collect to its stream.
+    """
+    message = json.dumps(get_payments_event(collect, payments), cls=JSONEncoder)
+    get_broker().publish(get_collect_stream_channel(collect.pk), message)
+
+
+async def collect_events(collect):
+    """
+    Server-Sent Events of the collect stream: current counters, then
+    payments as they come. Idle stream gets keepalive comments.
+    """
+    async with get_broker().subscribe(
+        get_collect_stream_channel(collect.pk)
+    ) as queue:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        yield format_event("collect", get_collect_state(collect))
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    queue.get(), STREAM_KEEPALIVE_SEC
+                )
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield f"event: payment\ndata: {message}\n\n"
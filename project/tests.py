@@ -1,3 +1,1439 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import json
+import tempfile
+from functools import partial
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from project.bench import get_bench_caches
+from project.cache import (
+    FEED_END_MARKER,
+    LEADERBOARD_AMOUNT_KEY,
+    LEADERBOARD_PROGRESS_KEY,
+    bump_collect_version,
+    get_collect_feed_cache_key,
+    get_donors_leaderboard_key,
+    find_feed_position,
+    get_feed_token,
+    push_feed_cache,
+    read_feed_cache,
+    write_feed_cache,
+    )
+from project.dbrouters import PRIMARY_DATABASE, REPLICA_DATABASE
+from project.stream import LocalBroker, get_broker
+from project.views import CollectViewSet
+from project.models import (
+    Collect,
+    CollectCounterShard,
+    CollectDailyStats,
+    CollectParticipant,
+    CollectSearchIndex,
+    OutboxEmail,
+    Payment,
+    get_shard_counter_annotations,
+    group_by_day,
+    )
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CollectListTests(TestCase):
+    """
+    Collect list: compact entries with annotations, payments only with
+    ?expand=payments, number of queries does not grow with collects.
+    """
+    def setUp(self):
+        self.homer = User.objects.create_user('homer', 'homer@example.com')
+        self.marge = User.objects.create_user('marge', 'marge@example.com')
+        self.collect = Collect.objects.create(
+            author=self.homer, title='Wedding', purpose='wedding',
+            target_amount=200,
+        )
+        self.collect.add_payment(self.homer, 30)
+        old = self.collect.add_payment(self.marge, 20)
+        Payment.objects.filter(pk=old.pk).update(
+            timestamp=timezone.now() - timedelta(days=2)
+        )
+        self.client = APIClient()
+
+    def get_list(self, **params):
+        cache.clear()
+        response = self.client.get('/api/collections/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_compact_entry(self):
+        entry, = self.get_list()
+
+        self.assertNotIn('payments', entry)
+        self.assertEqual(entry['recent_payments_count'], 1)
+        self.assertEqual(entry['progress'], 0.25)
+        self.assertEqual(entry['author']['username'], 'homer')
+
+    def test_expanded_entry(self):
+        entry, = self.get_list(expand='payments')
+
+        self.assertEqual(
+            [payment['amount'] for payment in entry['payments']],
+            ['30.00', '20.00']
+        )
+
+    def test_constant_number_of_queries(self):
+        for params in ({}, {'expand': 'payments'}):
+            with CaptureQueriesContext(connection) as one:
+                self.get_list(**params)
+            for i in range(5):
+                collect = Collect.objects.create(
+                    author=self.marge, title=f'Birthday {i}', purpose='birthday'
+                )
+                collect.add_payment(self.homer, 10)
+            with self.assertNumQueries(len(one)):
+                self.assertEqual(len(self.get_list(**params)), 10 if params else 6)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PaymentCursorPaginationTests(TestCase):
+    """
+    Cursor pagination of payments list and collect feed: newest first
+    by (timestamp, id), stable under new payments.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect = Collect.objects.create(
+            author=self.user, title='Wedding', purpose='wedding'
+        )
+        for amount in range(1, 26):
+            self.collect.add_payment(self.user, amount)
+        # ties: payments of one bulk request share the timestamp
+        moment = timezone.now()
+        Payment.objects.filter(amount__lte=12).update(timestamp=moment)
+        self.expected = list(Payment.objects.order_by(
+            '-timestamp', '-id'
+        ).values_list('id', flat=True))
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(response.data), {'next', 'results'})
+            ids += [payment['id'] for payment in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_pages_cover_payments_once(self):
+        for url in ('/api/payments/', f'/api/collections/{self.collect.pk}/feed/'):
+            self.assertEqual(self.walk(url), (self.expected, 3))
+
+    def test_feed_pages_past_cache(self):
+        with mock.patch('project.views.FEED_CACHE_SIZE', 15):
+            ids, _ = self.walk(f'/api/collections/{self.collect.pk}/feed/')
+        self.assertEqual(ids, self.expected)
+
+    def test_next_link_stable_under_new_payments(self):
+        for url in ('/api/payments/', f'/api/collections/{self.collect.pk}/feed/'):
+            cache.clear()
+            first = self.client.get(url).data
+            self.collect.add_payment(self.user, 100)
+
+            ids, _ = self.walk(first['next'])
+
+            self.assertEqual(
+                [payment['id'] for payment in first['results']] + ids,
+                self.expected
+            )
+            Payment.objects.filter(amount=100).delete()
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'bm90LWEtZGF0ZXwx'):
+            response = self.client.get('/api/payments/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, READ_REPLICA=True)
+class ReadReplicaRoutingTests(TestCase):
+    """
+    Primary and replica are separate SQLite databases here and nothing
+    replicates between them, so the database that served a read is
+    visible from the response.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        for database in (PRIMARY_DATABASE, REPLICA_DATABASE):
+            user = User.objects.db_manager(database).create_user(
+                'homer', 'homer@example.com', 'password'
+            )
+            Collect.objects.using(database).create(
+                pk=1,
+                author=user,
+                title=f'Wedding ({database})',
+                purpose='wedding',
+            )
+        self.user = User.objects.get(username='homer')
+        self.client = APIClient()
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.client.get('/api/collections/top/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['title'], 'Wedding (replica)')
+
+    def test_versioned_data_is_read_from_primary(self):
+        # ETag is the current version: data sent with it must not lag
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            '/api/collections/1/pay/', {'amount': 100}, format='json'
+        )
+        # another client, not pinned to primary by the write
+        client = APIClient()
+
+        for prefix in ('/api', '/api/async'):
+            response = client.get(f'{prefix}/collections/1/')
+            self.assertEqual(response.data['title'], 'Wedding (default)')
+            self.assertEqual(response.data['current_amount'], '100.00')
+            cache.clear()
+            response = client.get(f'{prefix}/collections/1/feed/')
+            self.assertEqual(len(response.data['results']), 1)
+
+    def test_reads_outside_requests_go_to_primary(self):
+        # workers and management commands
+        self.assertEqual(Collect.objects.get(pk=1).title, 'Wedding (default)')
+
+    def test_write_goes_to_primary(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(
+            '/api/collections/1/pay/', {'amount': 100}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 201)
+        primary = Collect.objects.using(PRIMARY_DATABASE).get(pk=1)
+        replica = Collect.objects.using(REPLICA_DATABASE).get(pk=1)
+        self.assertEqual(primary.current_amount, 100)
+        self.assertEqual(replica.current_amount, 0)
+
+    def test_client_reads_own_writes_after_write(self):
+        self.client.force_authenticate(self.user)
+        self.client.post(
+            '/api/collections/1/pay/', {'amount': 100}, format='json'
+        )
+
+        response = self.client.get('/api/collections/1/')
+
+        self.assertEqual(response.data['title'], 'Wedding (default)')
+        self.assertEqual(response.data['current_amount'], '100.00')
+
+    def test_pin_lasts_replica_lag_tolerance(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(
+            '/api/collections/1/pay/', {'amount': 100}, format='json'
+        )
+
+        self.assertEqual(
+            response.cookies['pin_primary']['max-age'],
+            settings.REPLICA_LAG_TOLERANCE_SEC
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FeedCacheTests(TestCase):
+    """
+    Collect feed cache: rebuild from DB racing with pushed payments.
+    """
+    @staticmethod
+    def payment(pk, timestamp):
+        return {'id': pk, 'timestamp': timestamp, 'amount': '1.00'}
+
+    def test_rebuild_is_written(self):
+        token = get_feed_token(1)
+        write_feed_cache(1, [self.payment(1, '2025-04-05T10:30:00Z')], True, token)
+
+        self.assertEqual(
+            read_feed_cache(1),
+            ([self.payment(1, '2025-04-05T10:30:00Z')], True)
+        )
+
+    def test_rebuild_is_dropped_after_push(self):
+        token = get_feed_token(1)
+        # payment committed while the feed was read from DB
+        push_feed_cache(1, self.payment(2, '2025-04-05T10:31:00Z'))
+        write_feed_cache(1, [self.payment(1, '2025-04-05T10:30:00Z')], True, token)
+
+        self.assertIsNone(read_feed_cache(1))
+
+    def test_position_keeps_timestamp_and_id_order(self):
+        items = [
+            json.dumps(self.payment(5, '2025-04-05T10:32:00Z')).encode(),
+            json.dumps(self.payment(3, '2025-04-05T10:30:00Z')).encode(),
+            FEED_END_MARKER.encode(),
+        ]
+
+        # pushed late, but older than the newest cached payment
+        self.assertEqual(
+            find_feed_position(items, self.payment(4, '2025-04-05T10:31:00Z')), 1
+        )
+        self.assertEqual(
+            find_feed_position(items, self.payment(6, '2025-04-05T10:32:00Z')), 0
+        )
+        self.assertEqual(
+            find_feed_position(items, self.payment(2, '2025-04-05T10:29:00Z')), 2
+        )
+        self.assertIsNone(
+            find_feed_position(items, self.payment(3, '2025-04-05T10:30:00Z'))
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AddPaymentTests(TestCase):
+    """
+    Collect.add_payment: counters are changed by one UPDATE, participant
+    is counted by insert-on-conflict.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect = Collect.objects.create(
+            author=self.user,
+            title='Wedding',
+            purpose='wedding',
+            target_amount=100,
+        )
+
+    def test_user_is_counted_once(self):
+        self.collect.add_payment(self.user, 10)
+        self.collect.add_payment(self.user, 20)
+
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, 30)
+        self.assertEqual(self.collect.participants, 1)
+
+    def test_concurrent_first_payment_is_not_a_new_participant(self):
+        # first payment of another request inserted the participant
+        # after this one started: conflict, not a second participant
+        CollectParticipant.add(self.collect.pk, self.user.pk)
+
+        self.collect.add_payment(self.user, 10)
+
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.participants, 0)
+        self.assertEqual(
+            CollectParticipant.objects.filter(collect=self.collect).count(), 1
+        )
+
+    def test_collect_is_finished_by_payment_reaching_target(self):
+        self.collect.add_payment(self.user, 60)
+        self.assertIsNone(self.collect.ended_at)
+
+        payment = self.collect.add_payment(self.user, 40)
+
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.ended_at, payment.timestamp)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkPaymentTests(TestCase):
+    """
+    Bulk payments: one update of every collect, stats per payments day.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collects = [
+            Collect.objects.create(
+                author=self.user, title=title, purpose='charity'
+            )
+            for title in ('Shelter', 'School')
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_payments_are_summed_per_collect(self):
+        shelter, school = self.collects
+
+        response = self.client.post('/api/payments/bulk/', {'payments': [
+            {'collect': school.pk, 'amount': '10.00'},
+            {'collect': shelter.pk, 'amount': '5.50'},
+            {'collect': school.pk, 'amount': '20.00'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 3)
+        shelter.refresh_from_db()
+        school.refresh_from_db()
+        self.assertEqual(
+            (shelter.current_amount, shelter.participants), (Decimal('5.50'), 1)
+        )
+        self.assertEqual(
+            (school.current_amount, school.participants), (Decimal('30.00'), 1)
+        )
+        stats = CollectDailyStats.objects.get(collect=school)
+        self.assertEqual(
+            (stats.amount, stats.payments, stats.donors),
+            (Decimal('30.00'), 2, 1)
+        )
+
+    def test_collects_are_updated_in_primary_key_order(self):
+        shelter, school = self.collects
+
+        with CaptureQueriesContext(connection) as queries:
+            Collect.add_payments(self.user, [
+                (school, Decimal('10.00')),
+                (shelter, Decimal('5.00')),
+            ])
+
+        updated = [
+            query['sql'].split('WHERE id = ')[1].split()[0]
+            for query in queries.captured_queries
+            if query['sql'].lstrip().startswith('UPDATE project_collect SET')
+        ]
+        self.assertEqual(updated, [str(shelter.pk), str(school.pk)])
+
+    def test_collect_is_finished_by_payment_reaching_target(self):
+        collect = self.collects[0]
+        collect.target_amount = Decimal('15.00')
+        collect.save()
+
+        payments = Collect.add_payments(self.user, [
+            (collect, Decimal('10.00')),
+            (collect, Decimal('5.00')),
+            (collect, Decimal('7.00')),
+        ])
+
+        collect.refresh_from_db()
+        self.assertEqual(collect.current_amount, Decimal('22.00'))
+        self.assertEqual(collect.ended_at, payments[1].timestamp)
+
+    def test_payments_are_grouped_by_their_day(self):
+        collect = self.collects[0]
+        payments = [
+            Payment(pk=pk, collect=collect, amount=1, timestamp=datetime(
+                2025, 4, day, hour, tzinfo=dt_timezone.utc
+            ))
+            for pk, day, hour in ((3, 6, 1), (1, 5, 23), (2, 6, 0))
+        ]
+
+        days = group_by_day(payments)
+
+        self.assertEqual(
+            [(day.day, [payment.pk for payment in group]) for day, group in days],
+            [(5, [1]), (6, [2, 3])]
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IdempotentPayTests(TestCase):
+    """
+    Pay with Idempotency-Key: one payment per user and key.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect, self.other = Collect.objects.bulk_create(
+            Collect(author=self.user, title=title, purpose='wedding')
+            for title in ('Wedding', 'Birthday')
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        cache.clear()
+
+    def pay(self, amount, collect=None, key='key-1'):
+        return self.client.post(
+            f'/api/collections/{(collect or self.collect).pk}/pay/',
+            {'amount': amount}, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.pay(5)
+        retry = self.pay('5.00')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_for_another_payment(self):
+        self.pay(5)
+
+        self.assertEqual(self.pay(6).status_code, 422)
+        self.assertEqual(self.pay(5, collect=self.other).status_code, 422)
+        self.assertEqual(self.pay(6, key='key-2').status_code, 201)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_payment_in_db_when_response_is_lost(self):
+        first = self.pay(5)
+        cache.clear()
+
+        retry = self.pay('5.0')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        cache.clear()
+        self.assertEqual(self.pay(7).status_code, 422)
+
+        self.assertEqual(Payment.objects.count(), 1)
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, 5)
+
+    def test_invalid_amount(self):
+        for amount in ('abc', -1, None):
+            self.assertEqual(self.pay(amount).status_code, 400)
+        self.assertFalse(Payment.objects.exists())
+
+
+class OutboxEmailTests(TestCase):
+    """
+    Outbox sender: emails are claimed before they are sent.
+    """
+    def setUp(self):
+        OutboxEmail.objects.bulk_create(
+            OutboxEmail(
+                subject=f'Payment {i}',
+                message='Thank you!',
+                from_email='from@example.com',
+                recipient='homer@example.com',
+            )
+            for i in range(3)
+        )
+
+    def test_claimed_emails_are_not_claimed_again(self):
+        first = OutboxEmail.claim(2, timedelta(minutes=10))
+        second = OutboxEmail.claim(10, timedelta(minutes=10))
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(
+            {email.pk for email in first} & {email.pk for email in second}
+        )
+        self.assertEqual(OutboxEmail.claim(10, timedelta(minutes=10)), [])
+
+    def test_emails_are_sent_once(self):
+        call_command('send_outbox_emails', stdout=StringIO())
+        call_command('send_outbox_emails', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            OutboxEmail.objects.filter(
+                status=OutboxEmail.SENT, claim_token=''
+            ).count(),
+            3
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PerformanceMiddlewareTests(TestCase):
+    """
+    Request timings are exposed only with PERF_VERBOSE.
+    """
+    @override_settings(PERF_VERBOSE=False)
+    def test_no_timings_by_default(self):
+        response = self.client.get('/api/collections/')
+
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(PERF_VERBOSE=True)
+    def test_verbose_sends_timings(self):
+        response = self.client.get('/api/collections/')
+
+        self.assertRegex(
+            response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"'
+        )
+
+
+class BenchCachesTests(TestCase):
+    """
+    Benchmarks never run against the configured cache: it is flushed.
+    """
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+    }})
+    def test_configured_redis_is_refused(self):
+        with self.assertRaises(CommandError):
+            call_command('bench', redis_url='redis://redis:6379/1')
+
+        caches = get_bench_caches('redis://redis:6379/15', 'bench')
+        self.assertEqual(caches['default']['LOCATION'], 'redis://redis:6379/15')
+        self.assertEqual(
+            get_bench_caches(None, 'bench')['default']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache'
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class GenerateFakeDataTests(TestCase):
+    """
+    Bulk mode of generate_fake_data: counters match generated payments.
+    """
+    def test_bulk_counters_match_payments(self):
+        call_command(
+            'generate_fake_data', bulk=True, seed=1, users=5,
+            collections=10, payments=2000, stdout=StringIO()
+        )
+
+        self.assertTrue(Collect.objects.filter(ended_at__isnull=False).exists())
+        for collect in Collect.objects.all():
+            payments = list(collect.payments.order_by('timestamp', 'id'))
+            self.assertEqual(
+                collect.current_amount,
+                sum((payment.amount for payment in payments), Decimal(0))
+            )
+            self.assertEqual(
+                collect.participants,
+                len({payment.user_id for payment in payments})
+            )
+            total, finishing = Decimal(0), None
+            for payment in payments:
+                total += payment.amount
+                if collect.target_amount and total >= collect.target_amount:
+                    finishing = payment.timestamp
+                    break
+            self.assertEqual(collect.ended_at, finishing)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReconcileCollectsTests(TestCase):
+    """
+    reconcile_collects: counters checked against payments.
+    """
+    def setUp(self):
+        self.homer = User.objects.create_user('homer', 'homer@example.com')
+        self.marge = User.objects.create_user('marge', 'marge@example.com')
+        self.drifted, self.correct = Collect.objects.bulk_create(
+            Collect(author=self.homer, title=title, purpose='wedding')
+            for title in ('Wedding', 'Birthday')
+        )
+        for collect in (self.drifted, self.correct):
+            collect.add_payment(self.homer, 10)
+            collect.add_payment(self.marge, 20)
+            collect.add_payment(self.homer, 5)
+        Collect.objects.filter(pk=self.drifted.pk).update(
+            current_amount=100, participants=1
+        )
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_collects', *args, chunk_size=1, stdout=out)
+        return out.getvalue()
+
+    def counters(self, collect):
+        collect.refresh_from_db()
+        return collect.current_amount, collect.participants
+
+    def test_reports_drift(self):
+        output = self.reconcile()
+
+        self.assertRegex(
+            output,
+            rf'Collect {self.drifted.pk}: amount 100.00 != 35(\.00)?, '
+            'participants 1 != 2'
+        )
+        self.assertNotIn(f'Collect {self.correct.pk}:', output)
+        self.assertIn('Checked 2 collections, 1 drifted', output)
+        self.assertIn('Run with --fix', output)
+        self.assertEqual(self.counters(self.drifted), (Decimal(100), 1))
+
+    def test_fix_sets_counters_from_payments(self):
+        output = self.reconcile('--fix')
+
+        self.assertIn('Fixed 1 collections.', output)
+        self.assertEqual(self.counters(self.drifted), (Decimal(35), 2))
+        self.assertEqual(self.counters(self.correct), (Decimal(35), 2))
+        self.assertIn('Checked 2 collections, 0 drifted', self.reconcile())
+
+    def test_not_folded_shards_are_not_drift(self):
+        Collect.objects.filter(pk=self.correct.pk).update(counter_shards=4)
+        self.correct.refresh_from_db()
+        self.correct.add_payment(self.homer, 15)
+
+        self.assertEqual(self.counters(self.correct), (Decimal(35), 2))
+        self.assertNotIn(f'Collect {self.correct.pk}:', self.reconcile())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CounterShardsTests(TestCase):
+    """
+    Sharded counters: payments go to shards, readers see combined
+    counters, fold_counter_shards moves shards to the collect row.
+    """
+    def setUp(self):
+        self.homer = User.objects.create_user('homer', 'homer@example.com')
+        self.marge = User.objects.create_user('marge', 'marge@example.com')
+        self.sharded, self.plain = Collect.objects.bulk_create([
+            Collect(
+                author=self.homer, title='Wedding', purpose='wedding',
+                target_amount=100, counter_shards=4,
+            ),
+            Collect(
+                author=self.homer, title='Birthday', purpose='birthday',
+                target_amount=100,
+            ),
+        ])
+        self.client = APIClient()
+
+    def row(self, collect):
+        return Collect.objects.values(
+            'current_amount', 'participants', 'ended_at'
+        ).get(pk=collect.pk)
+
+    def test_fold_moves_shards_to_collect(self):
+        self.sharded.add_payment(self.homer, 30)
+        self.sharded.add_payment(self.marge, 20)
+        self.assertEqual(self.row(self.sharded)['current_amount'], 0)
+        self.assertEqual(self.sharded.get_combined_counters(), (Decimal(50), 2))
+
+        call_command('fold_counter_shards', stdout=StringIO())
+
+        row = self.row(self.sharded)
+        self.assertEqual((row['current_amount'], row['participants']), (50, 2))
+        self.assertFalse(CollectCounterShard.objects.exclude(
+            amount=0, participants=0
+        ).exists())
+        self.assertIsNone(row['ended_at'])
+
+    def test_finished_when_combined_amount_crosses_target(self):
+        self.sharded.add_payment(self.homer, 60)
+        self.assertIsNone(self.row(self.sharded)['ended_at'])
+
+        payment = self.sharded.add_payment(self.marge, 50)
+
+        self.assertEqual(self.row(self.sharded)['ended_at'], payment.timestamp)
+        self.assertEqual(self.sharded.ended_at, payment.timestamp)
+        self.assertEqual(self.sharded.get_combined_counters(), (Decimal(110), 2))
+
+    def test_list_filters_and_orders_by_combined_amount(self):
+        self.sharded.add_payment(self.homer, 80)
+        self.plain.add_payment(self.homer, 50)
+
+        response = self.client.get(
+            '/api/collections/', {'ordering': '-current_amount'}
+        )
+        self.assertEqual(
+            [(row['id'], row['current_amount']) for row in response.data['results']],
+            [(self.sharded.pk, '80.00'), (self.plain.pk, '50.00')]
+        )
+        response = self.client.get('/api/collections/', {'min_progress': 0.7})
+        self.assertEqual(
+            [row['id'] for row in response.data['results']], [self.sharded.pk]
+        )
+
+    def test_leaderboard_fallback_ranks_by_combined_amount(self):
+        self.sharded.add_payment(self.homer, 80)
+        self.plain.add_payment(self.homer, 50)
+
+        for url in ('/api/collections/top/', '/api/collections/closest/'):
+            response = self.client.get(url)
+            self.assertEqual(
+                [(row['id'], row['current_amount']) for row in response.data],
+                [(self.sharded.pk, '80.00'), (self.plain.pk, '50.00')]
+            )
+
+    def test_stats_count_not_folded_participants(self):
+        self.sharded.add_payment(self.homer, 30)
+        self.sharded.add_payment(self.marge, 20)
+
+        response = self.client.get(f'/api/collections/{self.sharded.pk}/stats/')
+
+        self.assertEqual(response.data['participants'], 2)
+        self.assertEqual(response.data['amount'], '50.00')
+
+    def test_shards_are_summed_for_sharded_collects_only(self):
+        self.sharded.add_payment(self.homer, 30)
+        Collect.objects.filter(pk=self.sharded.pk).update(counter_shards=0)
+
+        collect = Collect.objects.annotate(
+            **get_shard_counter_annotations()
+        ).get(pk=self.sharded.pk)
+        self.assertIsNone(collect.shard_amount)
+        collect = Collect.objects.annotate(
+            **get_shard_counter_annotations(sharded_only=False)
+        ).get(pk=self.sharded.pk)
+        self.assertEqual(collect.shard_amount, 30)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalGetTests(TestCase):
+    """
+    ETag of collect detail and feed is the collect version read before
+    the data.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect = Collect.objects.create(
+            author=self.user, title='Wedding', purpose='wedding'
+        )
+        self.client = APIClient()
+
+    def test_not_modified_until_payment(self):
+        for url in (
+                f'/api/collections/{self.collect.pk}/',
+                f'/api/collections/{self.collect.pk}/feed/'):
+            etag = self.client.get(url)['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            self.client.force_authenticate(self.user)
+            self.client.post(
+                f'/api/collections/{self.collect.pk}/pay/',
+                {'amount': 10}, format='json'
+            )
+            self.client.force_authenticate(None)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_data_changed_meanwhile_keeps_older_version(self):
+        url = f'/api/collections/{self.collect.pk}/'
+        get_object = CollectViewSet.get_object
+
+        def get_object_and_pay(viewset):
+            # payment committed while the response is built
+            collect = get_object(viewset)
+            bump_collect_version(collect.pk)
+            return collect
+
+        with mock.patch.object(
+                CollectViewSet, 'get_object', get_object_and_pay):
+            etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class DailyStatsTests(TestCase):
+    """
+    Daily rollups: upserted with every payment, unique donors per day.
+    """
+    def setUp(self):
+        self.homer = User.objects.create_user('homer', 'homer@example.com')
+        self.marge = User.objects.create_user('marge', 'marge@example.com')
+        self.collect = Collect.objects.create(
+            author=self.homer, title='Wedding', purpose='wedding'
+        )
+
+    def test_rollup_is_upserted(self):
+        day = date(2025, 4, 5)
+        CollectDailyStats.add(self.collect.pk, day, Decimal('10.00'), donors=1)
+        CollectDailyStats.add(self.collect.pk, day, Decimal('5.50'))
+
+        stats = CollectDailyStats.objects.get(collect=self.collect)
+        self.assertEqual(
+            (stats.day, stats.amount, stats.payments, stats.donors),
+            (day, Decimal('15.50'), 2, 1)
+        )
+
+    def test_donors_are_counted_once_a_day(self):
+        self.collect.add_payment(self.homer, 10)
+        self.collect.add_payment(self.homer, 20)
+        self.collect.add_payment(self.marge, 5)
+
+        stats = CollectDailyStats.objects.get(collect=self.collect)
+        self.assertEqual(
+            (stats.day, stats.amount, stats.payments, stats.donors),
+            (timezone.localdate(), Decimal('35.00'), 3, 2)
+        )
+
+    def test_participant_is_a_donor_again_next_day(self):
+        paid_at = datetime(2025, 4, 5, 10, tzinfo=dt_timezone.utc)
+
+        def add_donor(delay):
+            return CollectParticipant.add_donor(
+                self.collect.pk, self.homer.pk, paid_at + delay
+            )
+
+        self.assertEqual(add_donor(timedelta()), (True, True))
+        self.assertEqual(add_donor(timedelta(hours=1)), (False, False))
+        self.assertEqual(add_donor(timedelta(days=1)), (False, True))
+
+    def test_stats_endpoint_reads_rollups(self):
+        self.collect.add_payment(self.homer, 10)
+        self.collect.add_payment(self.marge, 5)
+        today = timezone.localdate()
+
+        response = APIClient().get(
+            f'/api/collections/{self.collect.pk}/stats/',
+            {'since': today - timedelta(days=1), 'until': today}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['amount'], '15.00')
+        self.assertEqual(response.data['payments'], 2)
+        self.assertEqual(response.data['participants'], 2)
+        self.assertEqual(len(response.data['days']), 1)
+        self.assertEqual(response.data['days'][0]['donors'], 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LeaderboardTests(TestCase):
+    """
+    Leaderboards: ranked by Redis sorted sets, by DB without Redis.
+    """
+    def setUp(self):
+        self.homer = User.objects.create_user('homer', 'homer@example.com')
+        self.marge = User.objects.create_user('marge', 'marge@example.com')
+        self.shelter, self.school, self.party = [
+            Collect.objects.create(
+                author=self.homer,
+                title=title,
+                purpose='charity',
+                target_amount=target,
+            )
+            for title, target in (
+                ('Shelter', 1000), ('School', 100), ('Party', None)
+            )
+        ]
+        self.shelter.add_payment(self.homer, 300)
+        self.shelter.add_payment(self.marge, 200)
+        self.school.add_payment(self.marge, 50)
+        self.party.add_payment(self.homer, 900)
+        self.client = APIClient()
+
+    def ranked(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [(entry['id'], entry['score']) for entry in response.data]
+
+    def test_top_fallback_ranks_by_amount(self):
+        self.assertEqual(self.ranked('/api/collections/top/'), [
+            (self.party.pk, 900.0),
+            (self.shelter.pk, 500.0),
+            (self.school.pk, 50.0),
+        ])
+
+    def test_closest_fallback_ranks_active_collects_by_progress(self):
+        self.assertEqual(self.ranked('/api/collections/closest/'), [
+            (self.school.pk, 0.5),
+            (self.shelter.pk, 0.5),
+        ])
+
+        self.school.add_payment(self.homer, 50)
+
+        self.assertEqual(
+            self.ranked('/api/collections/closest/'), [(self.shelter.pk, 0.5)]
+        )
+
+    def test_top_donors_fallback_sums_payments(self):
+        self.shelter.add_payment(self.marge, 150)
+
+        response = self.client.get(
+            f'/api/collections/{self.shelter.pk}/top-donors/'
+        )
+
+        self.assertEqual(
+            [
+                (entry['user']['username'], entry['amount'])
+                for entry in response.data
+            ],
+            [('marge', '350.00'), ('homer', '300.00')]
+        )
+
+    def test_ranking_is_read_from_leaderboard(self):
+        scores = [(self.school.pk, 3.0), (12345, 2.0), (self.shelter.pk, 1.0)]
+
+        with mock.patch(
+                'project.views.read_leaderboard', return_value=scores) as read:
+            ranked = self.ranked('/api/collections/top/?limit=3')
+
+        read.assert_called_once_with(LEADERBOARD_AMOUNT_KEY, 3)
+        # collects deleted meanwhile are skipped
+        self.assertEqual(
+            ranked, [(self.school.pk, 3.0), (self.shelter.pk, 1.0)]
+        )
+
+    def test_payment_updates_leaderboards_after_commit(self):
+        redis = mock.MagicMock()
+        pipe = redis.pipeline.return_value
+
+        with mock.patch('project.cache.get_redis', return_value=redis):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.school.add_payment(self.homer, 25)
+
+        # scores of concurrent payments never go down
+        pipe.zadd.assert_any_call(
+            cache.make_key(LEADERBOARD_AMOUNT_KEY), {self.school.pk: 75.0},
+            gt=True
+        )
+        pipe.zadd.assert_any_call(
+            cache.make_key(LEADERBOARD_PROGRESS_KEY), {self.school.pk: 0.75},
+            gt=True
+        )
+        pipe.zincrby.assert_called_once_with(
+            cache.make_key(get_donors_leaderboard_key(self.school.pk)),
+            25.0,
+            self.homer.pk
+        )
+        pipe.execute.assert_called_once_with()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SearchIndexTriggersTests(TestCase):
+    """
+    Collect search index is kept in sync by triggers. SQLite drops them
+    when a migration rebuilds collect table: such migration has to
+    create them again (see 0010_collect_counter_shards).
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+
+    def search(self, text):
+        return list(Collect.objects.filter(
+            search_index__document__match=CollectSearchIndex.build_query(text)
+        ).values_list('title', flat=True))
+
+    def test_triggers_exist_after_migrations(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'project_collect' ORDER BY name"
+            )
+            triggers = [row[0] for row in cursor.fetchall()]
+
+        self.assertEqual(triggers, [
+            'project_collect_fts_delete',
+            'project_collect_fts_insert',
+            'project_collect_fts_update',
+        ])
+
+    def test_index_follows_collect_changes(self):
+        collect = Collect.objects.create(
+            author=self.user, title="Lisa's wedding", purpose='wedding'
+        )
+        self.assertEqual(self.search('wedd'), ["Lisa's wedding"])
+
+        collect.title = "Bart's birthday"
+        collect.save()
+        self.assertEqual(self.search('wedding'), [])
+        self.assertEqual(self.search('birth'), ["Bart's birthday"])
+
+        collect.delete()
+        self.assertEqual(self.search('birthday'), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CollectSearchTests(TestCase):
+    """
+    Search endpoint and search index rebuild.
+    """
+    def setUp(self):
+        user = User.objects.create_user('homer', 'homer@example.com')
+        self.wedding, self.party, self.school = Collect.objects.bulk_create(
+            Collect(
+                author=user, title=title, description=description,
+                purpose='wedding',
+            )
+            for title, description in (
+                ("Lisa's wedding", 'Wedding dinner and wedding music'),
+                ('Birthday party', 'Cake, balloons and a wedding singer '
+                                   'who also plays at birthdays and fairs'),
+                ('School trip', 'Bus tickets'),
+            )
+        )
+        self.client = APIClient()
+
+    def search(self, text):
+        cache.clear()
+        return self.client.get('/api/collections/search/', {'q': text})
+
+    def found(self, text):
+        response = self.search(text)
+        self.assertEqual(response.status_code, 200)
+        return [entry['id'] for entry in response.data['results']]
+
+    def test_most_relevant_first(self):
+        self.assertEqual(
+            self.found('wedding'), [self.wedding.pk, self.party.pk]
+        )
+
+    def test_last_word_is_prefix(self):
+        self.assertEqual(self.found('lisa wedd'), [self.wedding.pk])
+        self.assertEqual(self.found('bus tick'), [self.school.pk])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.found('school OR wedding'), [])
+        self.assertEqual(self.found('"trip'), [self.school.pk])
+
+    def test_query_without_words(self):
+        for text in ('', '  ', '*"-'):
+            self.assertEqual(self.search(text).status_code, 400)
+
+    def test_reindex_rebuilds_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO project_collect_fts (project_collect_fts) "
+                "VALUES ('delete-all')"
+            )
+        self.assertEqual(self.found('wedding'), [])
+
+        out = StringIO()
+        call_command('reindex_search', stdout=out)
+
+        self.assertIn('Reindexed 3 collections.', out.getvalue())
+        self.assertEqual(
+            self.found('wedding'), [self.wedding.pk, self.party.pk]
+        )
+
+    def test_reindex_empty_table(self):
+        Collect.objects.all().delete()
+
+        out = StringIO()
+        call_command('reindex_search', stdout=out)
+
+        self.assertIn('Reindexed 0 collections.', out.getvalue())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AsyncReadViewsTests(TestCase):
+    """
+    Async read views answer as their sync viewset counterparts.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect, other = Collect.objects.bulk_create(
+            Collect(author=self.user, title=title, purpose='wedding',
+                    target_amount=100)
+            for title in ('Wedding', 'Birthday')
+        )
+        for amount in range(1, 13):
+            self.collect.add_payment(self.user, amount)
+        other.add_payment(self.user, 40)
+
+    async def get_both(self, path, reset=None):
+        """
+        (sync response, async response) of the path, `reset` cache
+        before each (cleared by default).
+        """
+        reset = reset or cache.clear
+        await sync_to_async(reset)()
+        sync = await sync_to_async(self.client.get)(f'/api{path}')
+        await sync_to_async(reset)()
+        response = await self.async_client.get(f'/api/async{path}')
+        return sync, response
+
+    async def test_lists_match(self):
+        for path in ('/collections/', '/payments/'):
+            sync, response = await self.get_both(path)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'], sync.json()['results'])
+
+    async def test_detail_and_feed_match_with_etag(self):
+        for path in (
+                f'/collections/{self.collect.pk}/',
+                f'/collections/{self.collect.pk}/feed/'):
+            # collect version (ETag) is kept, feed is read from DB
+            sync, response = await self.get_both(path, partial(
+                cache.delete, get_collect_feed_cache_key(self.collect.pk)
+            ))
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['ETag'], sync['ETag'])
+            body, sync_body = response.json(), sync.json()
+            if 'next' in body:
+                # next links point to their own endpoints
+                self.assertEqual(
+                    body.pop('next').replace('/api/async/', '/api/'),
+                    sync_body.pop('next')
+                )
+            self.assertEqual(body, sync_body)
+
+    async def test_not_modified(self):
+        for path in (
+                f'/api/async/collections/{self.collect.pk}/',
+                f'/api/async/collections/{self.collect.pk}/feed/'):
+            etag = (await self.async_client.get(path))['ETag']
+
+            response = await self.async_client.get(
+                path, headers={'If-None-Match': etag}
+            )
+
+            self.assertEqual(response.status_code, 304)
+
+    async def test_missing_collect(self):
+        for path in ('/collections/12345/', '/collections/12345/feed/'):
+            sync, response = await self.get_both(path)
+
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json(), sync.json())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PaymentsExportTests(TestCase):
+    """
+    Payments export: streamed files, for the collect author only.
+    """
+    def setUp(self):
+        self.homer = User.objects.create_user('homer', 'homer@example.com')
+        self.marge = User.objects.create_user('marge', 'marge@example.com')
+        self.collect = Collect.objects.create(
+            author=self.homer, title='Wedding', purpose='wedding'
+        )
+        for amount in range(1, 11):
+            self.collect.add_payment(self.marge, amount)
+        # ties on timestamp across chunk boundaries
+        Payment.objects.filter(amount__in=[3, 4, 5, 6, 7]).update(
+            timestamp=timezone.now()
+        )
+        self.expected = list(Payment.objects.order_by(
+            '-timestamp', '-id'
+        ).values_list('id', flat=True))
+        self.client = APIClient()
+        self.client.force_authenticate(self.homer)
+
+    def export(self, export_type):
+        # chunks of 3: 10 payments take four queries
+        with mock.patch('project.export.EXPORT_CHUNK_SIZE', 3):
+            response = self.client.get(
+                f'/api/collections/{self.collect.pk}/export/',
+                {'type': export_type}
+            )
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response.streaming_content).decode()
+        return response, content
+
+    def test_csv(self):
+        response, content = self.export('csv')
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(
+            f'collect_{self.collect.pk}_payments.csv',
+            response['Content-Disposition']
+        )
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([int(row['id']) for row in rows], self.expected)
+        self.assertEqual(
+            set(rows[0]), {'id', 'user', 'username', 'amount', 'timestamp'}
+        )
+        self.assertEqual(rows[-1]['username'], 'marge')
+        self.assertEqual(rows[-1]['amount'], '1.00')
+
+    def test_ndjson(self):
+        response, content = self.export('ndjson')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row['id'] for row in rows], self.expected)
+        self.assertEqual(rows[-1]['user'], self.marge.pk)
+        self.assertEqual(rows[-1]['amount'], '1.00')
+
+    def test_empty_csv_has_header(self):
+        Payment.objects.all().delete()
+
+        _, content = self.export('csv')
+
+        self.assertEqual(content.strip(), 'id,user,username,amount,timestamp')
+
+    def test_author_only(self):
+        self.client.force_authenticate(self.marge)
+        self.assertEqual(self.client.get(
+            f'/api/collections/{self.collect.pk}/export/'
+        ).status_code, 403)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(
+            f'/api/collections/{self.collect.pk}/export/'
+        ).status_code, 401)
+
+    def test_unknown_type(self):
+        response = self.client.get(
+            f'/api/collections/{self.collect.pk}/export/', {'type': 'xml'}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CollectStreamTests(TestCase):
+    """
+    Collect stream (Server-Sent Events) over the in-process broker.
+    """
+    def setUp(self):
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect = Collect.objects.create(
+            author=self.user, title='Wedding', purpose='wedding',
+            target_amount=100,
+        )
+
+    def pay(self, amount):
+        # events are published after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.collect.add_payment(self.user, amount)
+
+    async def open_stream(self):
+        response = await AsyncClient().get(
+            f'/api/collections/{self.collect.pk}/stream/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    @staticmethod
+    async def next_frame(frames):
+        return (await anext(frames)).decode()
+
+    @staticmethod
+    async def disconnect(frames):
+        """
+        Client went away: ASGI handler cancels the task sending the
+        stream while it waits for the next event.
+        """
+        task = asyncio.ensure_future(anext(frames))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    @staticmethod
+    def event_data(frame):
+        event, data = frame.strip().split('\n')
+        return (
+            event.removeprefix('event: '),
+            json.loads(data.removeprefix('data: '))
+        )
+
+    async def test_state_then_committed_payments(self):
+        self.assertIsInstance(get_broker(), LocalBroker)
+        frames = await self.open_stream()
+
+        self.assertEqual(await self.next_frame(frames), 'retry: 3000\n\n')
+        event, data = self.event_data(await self.next_frame(frames))
+        self.assertEqual(event, 'collect')
+        self.assertEqual(data['current_amount'], '0.00')
+
+        await sync_to_async(self.pay)(40)
+
+        event, data = self.event_data(await self.next_frame(frames))
+        self.assertEqual(event, 'payment')
+        self.assertEqual(data['collect']['current_amount'], '40.00')
+        self.assertEqual(data['collect']['participants'], 1)
+        self.assertEqual(data['payments'][0]['amount'], '40.00')
+        self.assertEqual(data['payments'][0]['user']['username'], 'homer')
+        await self.disconnect(frames)
+
+    async def test_idle_stream_gets_keepalive(self):
+        frames = await self.open_stream()
+        await self.next_frame(frames)
+        await self.next_frame(frames)
+
+        with mock.patch('project.stream.STREAM_KEEPALIVE_SEC', 0.01):
+            self.assertEqual(await self.next_frame(frames), ': keepalive\n\n')
+        await self.disconnect(frames)
+
+    async def test_disconnect_unsubscribes_client(self):
+        channel = f'collect_stream_{self.collect.pk}'
+        frames = await self.open_stream()
+        await self.next_frame(frames)
+        await self.next_frame(frames)
+        self.assertIn(channel, get_broker().subscribers)
+
+        await self.disconnect(frames)
+
+        self.assertNotIn(channel, get_broker().subscribers)
+
+    async def test_closed_broker_ends_stream(self):
+        frames = await self.open_stream()
+        await self.next_frame(frames)
+        await self.next_frame(frames)
+
+        get_broker().close_all()
+
+        with self.assertRaises(StopAsyncIteration):
+            await self.next_frame(frames)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ImageVariantsTests(TestCase):
+    """
+    Image variants worker and backfill.
+    """
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.user = User.objects.create_user('homer', 'homer@example.com')
+        self.collect = Collect.objects.create(
+            author=self.user, title='Wedding', purpose='wedding',
+            target_amount=100, image_variants_pending=True,
+        )
+
+    def upload(self, content):
+        self.collect.image.save('photo.png', ContentFile(content))
+
+    @staticmethod
+    def png():
+        content = BytesIO()
+        Image.new('RGBA', (40, 30), (255, 0, 0, 128)).save(content, 'PNG')
+        return content.getvalue()
+
+    def generate(self):
+        call_command('generate_image_variants', stdout=StringIO())
+        self.collect.refresh_from_db()
+
+    def test_all_regenerates_before_old_files_are_deleted(self):
+        self.upload(self.png())
+        self.generate()
+        old = self.collect.image_variants
+        storage = self.collect.image.storage
+        self.assertTrue(storage.exists(old['thumb']['webp']))
+
+        call_command('backfill_image_variants', '--all', stdout=StringIO())
+        self.collect.refresh_from_db()
+        # queued: old variants are still served
+        self.assertTrue(self.collect.image_variants_pending)
+        self.assertEqual(self.collect.image_variants, old)
+        self.assertTrue(storage.exists(old['thumb']['webp']))
+
+        self.generate()
+        new = self.collect.image_variants
+        self.assertFalse(self.collect.image_variants_pending)
+        self.assertNotEqual(new['thumb']['webp'], old['thumb']['webp'])
+        self.assertTrue(storage.exists(new['thumb']['webp']))
+        self.assertFalse(storage.exists(old['thumb']['webp']))
+
+    def test_undecodable_image_leaves_queue(self):
+        self.upload(b'not an image')
+        with self.assertLogs('project.management.commands.generate_image_variants'):
+            self.generate()
+
+        self.assertFalse(self.collect.image_variants_pending)
+        self.assertEqual(self.collect.image_variants, {})
+
+    def test_storage_error_keeps_image_queued(self):
+        self.upload(self.png())
+        with mock.patch(
+            'project.management.commands.generate_image_variants.save_variants',
+            side_effect=OSError('disk full'),
+        ), self.assertLogs('project.management.commands.generate_image_variants'):
+            self.generate()
+
+        self.assertTrue(self.collect.image_variants_pending)
+
+        self.generate()
+        self.assertFalse(self.collect.image_variants_pending)
+        self.assertEqual(set(self.collect.image_variants), {'thumb', 'medium'})
@@ -1,7 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from project.views import CollectViewSet, PaymentViewSet, AuthViewSet
+from project.async_views import (
+    CollectDetailView,
+    CollectFeedView,
+    CollectListView,
+    PaymentListView,
+)
+from project.views import (
+    AuthViewSet,
+    CollectViewSet,
+    PaymentViewSet,
+    collect_stream,
+)
 
 router = DefaultRouter()
 router.register(r'collections', CollectViewSet, basename='collection')
@@ -11,7 +22,37 @@ router.register(r'payments', PaymentViewSet, basename='payment')
 auth_router = DefaultRouter()
 auth_router.register(r'auth', AuthViewSet, basename='auth')
 
+# async read views, served concurrently by ASGI server (core.asgi)
+async_urlpatterns = [
+    path(
+        'collections/',
+        CollectListView.as_view(),
+        name='async-collection-list'
+    ),
+    path(
+        'collections/<int:pk>/',
+        CollectDetailView.as_view(),
+        name='async-collection-detail'
+    ),
+    path(
+        'collections/<int:pk>/feed/',
+        CollectFeedView.as_view(),
+        name='async-collection-feed'
+    ),
+    path(
+        'payments/',
+        PaymentListView.as_view(),
+        name='async-payment-list'
+    ),
+]
+
 urlpatterns = [
+    path(
+        'collections/<int:pk>/stream/',
+        collect_stream,
+        name='collection-stream'
+    ),
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
     path('', include(auth_router.urls)),
     path('token/', TokenObtainPairView.as_view(), name="token_obtain_pair"),
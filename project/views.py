@@ -1,9 +1,28 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
 from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError
+from django.db.models import (
+    Count,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+    )
+from django.db.models.functions import Coalesce
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 
 from django.contrib.auth.models import User
 
 from rest_framework import viewsets, status
 from rest_framework import permissions
+from rest_framework.filters import OrderingFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import (IsAuthenticatedOrReadOnly,
@@ -15,22 +34,73 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 
-from project.models import Collect, Payment
+from project.cache import (
+    COLLECT_LIST_NAMESPACE,
+    FEED_CACHE_SIZE,
+    LEADERBOARD_AMOUNT_KEY,
+    LEADERBOARD_PROGRESS_KEY,
+    PAYMENT_LIST_NAMESPACE,
+    bump_collect_version,
+    bump_generation,
+    cache_get,
+    cache_set,
+    drop_feed_cache,
+    get_collect_feed_cache_key,
+    get_collect_version,
+    get_collect_version_cache_key,
+    get_donors_leaderboard_key,
+    get_feed_token,
+    get_query_cache_key,
+    push_feed_cache,
+    read_feed_cache,
+    read_leaderboard,
+    remove_from_leaderboards,
+    update_leaderboards,
+    write_feed_cache,
+    )
+from project.dbrouters import pin_primary
+from project.export import EXPORT_TYPES, export_payments
+from project.idempotency import (
+    IDEMPOTENCY_HEADER,
+    IDEMPOTENCY_KEY_MAX_LENGTH,
+    get_request_fingerprint,
+    get_stored_response,
+    lock_key,
+    store_response,
+    unlock_key,
+    )
+from project.models import (
+    Collect,
+    CollectDailyStats,
+    CollectParticipant,
+    CollectSearchIndex,
+    Payment,
+    get_combined_amount_expression,
+    get_progress_expression,
+    get_shard_counter_annotations,
+    )
+from project.pagination import PaymentCursorPagination
 from project.serializers import (
+    BulkPaymentSerializer,
+    CollectFilterSerializer,
+    CollectListSerializer,
+    CollectParticipantSerializer,
+    CollectRankSerializer,
     CollectSerializer,
+    DailyStatsSerializer,
+    DayStatsSerializer,
+    DonorRankSerializer,
+    LeaderboardQuerySerializer,
     PaymentSerializer,
+    PurposeStatsSerializer,
+    StatsPeriodSerializer,
+    StatsTotalSerializer,
     UserSerializer,
     UserRegistrationSerializer
     )
-# Cache key
-COLLECT_LIST_CACHE_KEY = "collect_list_v1"
-# Cache lifetime param (sec)
-CACHE_LIFETIME_PERIOD_SEC = 900
-
-
-def get_collect_feed_cache_key(collect_id):
-    "Return cache id"
-    return f"collect_feed_{collect_id}"
+from project.stream import collect_events
+# Window for the recent payments counter in collect list
+RECENT_PAYMENTS_PERIOD = timedelta(hours=24)
 
 
 class AuthViewSet(viewsets.ViewSet):
@@ -88,6 +158,32 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         return obj.author == request.user
 
 
+class IsAuthor(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        """
+        Check permissions: only author can access.
+        """
+        return obj.author == request.user
+
+
+class CollectOrderingFilter(OrderingFilter):
+    """
+    Collect ordering: `current_amount` orders by the combined amount
+    (not folded counter shards included, annotated by the viewset).
+    """
+    aliases = {'current_amount': 'combined_amount'}
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering is None:
+            return None
+        terms = []
+        for term in ordering:
+            field = term.lstrip('-')
+            terms.append(term.replace(field, self.aliases.get(field, field)))
+        return terms
+
+
 class CollectViewSet(viewsets.ModelViewSet):
     """
     Collect viewset after serialization.
@@ -95,39 +191,181 @@ class CollectViewSet(viewsets.ModelViewSet):
     queryset = Collect.objects.all()
     serializer_class = CollectSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    filter_backends = [CollectOrderingFilter]
+    # amount and progress include counter shards of sharded collects,
+    # so only `created_at` is read from its index (see Collect.Meta.indexes)
+    ordering_fields = ['created_at', 'current_amount', 'progress']
+    ordering = ['-created_at', '-id']
+
+    def expand_payments(self):
+        """
+        Payments are embedded into list only with `?expand=payments`.
+        """
+        expand = self.request.query_params.get('expand', '')
+        return 'payments' in expand.split(',')
+
+    def get_queryset(self):
+        """
+        List and search: author joined, recent payments counted by subquery.
+        List: filtered by query params.
+        Detail (or expanded list): payments with users prefetched.
+        """
+        queryset = super().get_queryset().select_related('author').annotate(
+            **get_shard_counter_annotations()
+        ).annotate(
+            combined_amount=get_combined_amount_expression()
+        ).annotate(
+            progress=get_progress_expression('combined_amount')
+        )
+        if self.action == 'list':
+            queryset = self.filter_collects(queryset)
+        if self.action in ('list', 'search'):
+            recent_payments = Payment.objects.filter(
+                collect=OuterRef('pk'),
+                timestamp__gte=timezone.now() - RECENT_PAYMENTS_PERIOD
+            ).order_by().values('collect').annotate(
+                count=Count('pk')
+            ).values('count')
+            queryset = queryset.annotate(
+                recent_payments_count=Coalesce(Subquery(recent_payments), 0)
+            )
+        if self.action == 'retrieve' or (
+                self.action == 'list' and self.expand_payments()):
+            queryset = queryset.prefetch_related(Prefetch(
+                'payments',
+                queryset=Payment.objects.select_related('user')
+            ))
+        return queryset
+
+    def filter_collects(self, queryset):
+        """
+        Apply collect list filters from query params.
+        """
+        serializer = CollectFilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        if 'purpose' in filters:
+            queryset = queryset.filter(purpose=filters['purpose'])
+        if 'status' in filters:
+            queryset = queryset.filter(
+                ended_at__isnull=filters['status'] == 'active'
+            )
+        if 'author' in filters:
+            queryset = queryset.filter(author_id=filters['author'])
+        if 'min_progress' in filters:
+            queryset = queryset.filter(progress__gte=filters['min_progress'])
+        if 'max_progress' in filters:
+            queryset = queryset.filter(progress__lte=filters['max_progress'])
+        return queryset
+
+    def get_serializer_class(self):
+        """
+        Compact serializer for list and search, full one for everything else.
+        """
+        if self.action == 'search' or (
+                self.action == 'list' and not self.expand_payments()):
+            return CollectListSerializer
+        return CollectSerializer
+
+    def conditional(self, kind, view, request, *args, **kwargs):
+        """
+        Conditional GET for collect data: ETag and Last-Modified come
+        from collect version in cache, so 304 Not Modified is returned
+        without DB queries and serialization.
+        Version is read once, before the data: data changed meanwhile
+        goes out with the older version, never the other way round.
+        Data is read from primary: lagging replica would send old data
+        with the new version, kept by clients (304) until next change.
+        """
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        validators = get_collect_version(pk)
+        response = self.not_modified(kind, pk, request, validators)
+        if response is not None:
+            return response
+        with pin_primary():
+            response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            self.set_validators(kind, pk, response, validators)
+        return response
+
+    @staticmethod
+    def not_modified(kind, pk, request, validators):
+        """
+        304 Not Modified response if client has this collect version
+        (`validators` from cache), None otherwise.
+        """
+        version, last_modified = validators
+        return get_conditional_response(
+            request,
+            etag=quote_etag(f"{kind}-{pk}-{version}"),
+            last_modified=int(last_modified.timestamp()),
+        )
+
+    @staticmethod
+    def set_validators(kind, pk, response, validators):
+        """
+        Put collect version to ETag and Last-Modified headers.
+        """
+        version, last_modified = validators
+        response['ETag'] = quote_etag(f"{kind}-{pk}-{version}")
+        response['Last-Modified'] = http_date(last_modified.timestamp())
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Collect detail with conditional GET support.
+        """
+        return self.conditional(
+            'collect', super().retrieve, request, *args, **kwargs
+        )
+
+    @swagger_auto_schema(query_serializer=CollectFilterSerializer)
     def list(self, request, *args, **kwargs):
         """
         Overrided default method list: add cache.
+        Cache key depends on query params (page, expand etc.).
+        Cached data is read from primary: lagging replica must not
+        get into cache.
         """
-        cached_data = cache.get(COLLECT_LIST_CACHE_KEY)
+        cache_key = get_query_cache_key(COLLECT_LIST_NAMESPACE, request)
+        cached_data = cache_get(cache_key)
         if cached_data is not None:
-            print('!!!!!!Read from cache')
             return Response(cached_data)
-        print('!!!!!Read from BD')
-        response = super().list(request, *args, **kwargs)
-        cache.set(COLLECT_LIST_CACHE_KEY,
-                  response.data,
-                  timeout=CACHE_LIFETIME_PERIOD_SEC)
-        print('!!!!!!!!!DATA SAVE to DB')
+        with pin_primary():
+            response = super().list(request, *args, **kwargs)
+        cache_set(cache_key, response.data)
         return response
 
     def perform_create(self, serializer):
         """
         Create new collect.
         Author = the user who created the collect.
+        Uploaded image is queued for `generate_image_variants` worker.
         Clear cache after new collect created
         """
-        obj = serializer.save(author=self.request.user)
-        cache.delete(COLLECT_LIST_CACHE_KEY)
+        obj = serializer.save(
+            author=self.request.user,
+            image_variants_pending=bool(serializer.validated_data.get('image'))
+        )
+        bump_generation(COLLECT_LIST_NAMESPACE)
+        update_leaderboards(obj)
         return obj
 
     def perform_update(self, serializer):
         """
         Overrided default update method: delete cache if obj updated.
+        New image drops variants of the old one and is queued for
+        `generate_image_variants` worker.
         """
-        obj = serializer.save()
-        cache.delete(COLLECT_LIST_CACHE_KEY)
+        if 'image' in serializer.validated_data:
+            serializer.instance.drop_image_variants()
+            obj = serializer.save(
+                image_variants_pending=bool(serializer.validated_data['image'])
+            )
+        else:
+            obj = serializer.save()
+        bump_generation(COLLECT_LIST_NAMESPACE)
+        bump_collect_version(obj.id)
+        update_leaderboards(obj)
         cache.delete(f"collect_id_{obj.id}")
         return obj
 
@@ -135,29 +373,313 @@ class CollectViewSet(viewsets.ModelViewSet):
         """
         Overrided default destroy method: clear cache before obj deleted.
         """
-        cache.delete(COLLECT_LIST_CACHE_KEY)
+        bump_generation(COLLECT_LIST_NAMESPACE)
+        bump_generation(PAYMENT_LIST_NAMESPACE)
         cache.delete(f"collect_detail_{instance.id}")
         cache.delete(get_collect_feed_cache_key(instance.id))
+        cache.delete(get_collect_version_cache_key(instance.id))
+        remove_from_leaderboards(instance.id)
+        instance.drop_image_variants()
         instance.delete()
 
+    @swagger_auto_schema(
+        manual_parameters=[openapi.Parameter(
+            'q',
+            openapi.IN_QUERY,
+            description='Words to find in title or description',
+            type=openapi.TYPE_STRING,
+            required=True
+        )],
+        responses={200: CollectListSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        Full-text search in collections title and description,
+        most relevant first, paginated.
+        """
+        query = CollectSearchIndex.build_query(request.query_params.get('q', ''))
+        if not query:
+            return Response(
+                {"err": "Search query must contain words"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        collects = self.get_queryset().filter(
+            search_index__document__match=query
+        ).order_by('search_index__rank', '-id')
+        page = self.paginate_queryset(collects)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['get'], url_path='feed')
     def payments_feed(self, request, pk=None):
         """
-        Payment feed with cache.
+        Payment feed with conditional GET support.
+        """
+        return self.conditional('feed', self.feed_page, request, pk=pk)
+
+    def feed_page(self, request, pk=None):
+        """
+        Payment feed: cursor paginated.
+        Recent payments are served from feed cache (kept up to date by pay),
+        missing feed cache is rebuilt from DB (not written if a payment
+        is pushed meanwhile), older pages are read from DB. DB is the
+        primary one (see `conditional`).
         """
         collect = self.get_object()
-        cache_key = get_collect_feed_cache_key(collect.id)
-        cached_data = cache.get(cache_key)
-        if cached_data is not None:
-            return Response(cached_data)
+        paginator = PaymentCursorPagination()
+        cached = read_feed_cache(collect.id)
+        if cached is None:
+            token = get_feed_token(collect.id)
+            payments = PaymentSerializer(
+                self.get_feed_recent(collect), many=True
+            ).data
+            cached = self.get_feed_cache_entry(payments)
+            write_feed_cache(collect.id, *cached, token)
+        page = paginator.paginate_cached(*cached, request)
+        if page is not None:
+            return paginator.get_paginated_response(page)
 
-        payments = collect.payments.all().order_by('-timestamp')
+        payments = paginator.paginate_queryset(
+            collect.payments.select_related('user'), request, view=self
+        )
         serializer = PaymentSerializer(payments, many=True)
-        data = serializer.data
-        cache.set(cache_key,
-                  data,
-                  timeout=CACHE_LIFETIME_PERIOD_SEC)
-        return Response(data)
+        return paginator.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def get_feed_recent(collect):
+        """
+        Newest payments of the collect for feed cache, with one extra
+        to know if cache holds all of them.
+        """
+        return collect.payments.select_related('user').order_by(
+            *PaymentCursorPagination.ordering
+        )[:FEED_CACHE_SIZE + 1]
+
+    @staticmethod
+    def get_feed_cache_entry(payments):
+        """
+        (payments, complete) of feed cache from serialized recent payments.
+        """
+        return payments[:FEED_CACHE_SIZE], len(payments) <= FEED_CACHE_SIZE
+
+    @swagger_auto_schema(
+        responses={200: CollectParticipantSerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'], url_path='donors')
+    def donors(self, request, pk=None):
+        """
+        Collect donors: unique participants, newest first.
+        """
+        collect = self.get_object()
+        donors = CollectParticipant.objects.filter(
+            collect=collect
+        ).select_related('user')
+        page = self.paginate_queryset(donors)
+        serializer = CollectParticipantSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @swagger_auto_schema(
+        manual_parameters=[openapi.Parameter(
+            'type',
+            openapi.IN_QUERY,
+            description='Export file type',
+            type=openapi.TYPE_STRING,
+            enum=sorted(EXPORT_TYPES),
+            default='csv'
+        )],
+        responses={200: 'Payments file (streamed)'}
+    )
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='export',
+        permission_classes=[IsAuthenticated, IsAuthor]
+        )
+    def export(self, request, pk=None):
+        """
+        All payments of the collect as CSV or NDJSON file, for author
+        only. Streamed: never built in memory or cached.
+        """
+        collect = self.get_object()
+        export_type = request.query_params.get('type', 'csv')
+        if export_type not in EXPORT_TYPES:
+            return Response(
+                {"err": f"Export type must be one of: {', '.join(EXPORT_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return export_payments(collect, export_type)
+
+    def get_stats_period(self):
+        """
+        Validated stats period from query params.
+        """
+        serializer = StatsPeriodSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @staticmethod
+    def get_stats_total(rows):
+        """
+        Payments amount and count of the stats rows.
+        """
+        return StatsTotalSerializer({
+            'amount': sum((row['amount'] for row in rows), Decimal(0)),
+            'payments': sum(row['payments'] for row in rows),
+        }).data
+
+    @swagger_auto_schema(query_serializer=StatsPeriodSerializer)
+    @action(detail=True, methods=['get'], url_path='stats')
+    def stats(self, request, pk=None):
+        """
+        Collect stats for the period: totals and amount, payments and
+        unique donors per day. Read from daily rollups only.
+        """
+        collect = self.get_object()
+        # sharded collect: with not folded participants, as in detail
+        _, participants = collect.get_combined_counters()
+        period = self.get_stats_period()
+        days = collect.daily_stats.filter(
+            day__range=(period['since'], period['until'])
+        ).order_by('day').values('day', 'amount', 'payments', 'donors')
+        days = list(days)
+        return Response({
+            'collect': collect.id,
+            **period,
+            'participants': participants,
+            **self.get_stats_total(days),
+            'days': DailyStatsSerializer(days, many=True).data,
+        })
+
+    @swagger_auto_schema(query_serializer=StatsPeriodSerializer)
+    @action(detail=False, methods=['get'], url_path='stats')
+    def global_stats(self, request):
+        """
+        Stats of all collections for the period: totals, amount and
+        payments per day and per purpose. Read from daily rollups only.
+        """
+        period = self.get_stats_period()
+        rollups = CollectDailyStats.objects.filter(
+            day__range=(period['since'], period['until'])
+        ).order_by()
+        days = list(rollups.values('day').annotate(
+            amount=Sum('amount'),
+            payments=Sum('payments'),
+        ).order_by('day'))
+        purposes = rollups.values(purpose=F('collect__purpose')).annotate(
+            amount=Sum('amount'),
+            payments=Sum('payments'),
+        ).order_by('purpose')
+        return Response({
+            **period,
+            **self.get_stats_total(days),
+            'days': DayStatsSerializer(days, many=True).data,
+            'purposes': PurposeStatsSerializer(purposes, many=True).data,
+        })
+
+    def get_leaderboard_limit(self):
+        """
+        Validated number of leaderboard entries from query params.
+        """
+        serializer = LeaderboardQuerySerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['limit']
+
+    def collect_leaderboard(self, key, fallback):
+        """
+        Collects of the leaderboard with their scores and combined
+        counters. Ranking is read from Redis, collects by primary key.
+        Without Redis (dev, tests) `fallback` queryset (with shard
+        annotations) is ranked by DB.
+        """
+        limit = self.get_leaderboard_limit()
+        scores = read_leaderboard(key, limit)
+        if scores is None:
+            collects = list(fallback[:limit])
+        else:
+            found = Collect.objects.annotate(
+                **get_shard_counter_annotations()
+            ).order_by().in_bulk(
+                [pk for pk, _ in scores]
+            )
+            collects = []
+            # collects deleted with their authors may be left in Redis
+            for pk, score in scores:
+                if pk in found:
+                    found[pk].score = score
+                    collects.append(found[pk])
+        for collect in collects:
+            collect.current_amount, collect.participants = (
+                collect.get_combined_counters()
+            )
+        serializer = CollectRankSerializer(collects, many=True)
+        return Response(serializer.data)
+
+    @swagger_auto_schema(
+        query_serializer=LeaderboardQuerySerializer,
+        responses={200: CollectRankSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], url_path='top')
+    def top(self, request):
+        """
+        Collections with the highest collected amount.
+        """
+        return self.collect_leaderboard(
+            LEADERBOARD_AMOUNT_KEY,
+            Collect.objects.annotate(
+                **get_shard_counter_annotations()
+            ).annotate(
+                score=get_combined_amount_expression()
+            ).order_by('-score', '-id')
+        )
+
+    @swagger_auto_schema(
+        query_serializer=LeaderboardQuerySerializer,
+        responses={200: CollectRankSerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'], url_path='closest')
+    def closest(self, request):
+        """
+        Active collections closest to their target amount:
+        score is the collected part of the target.
+        """
+        return self.collect_leaderboard(
+            LEADERBOARD_PROGRESS_KEY,
+            Collect.objects.filter(
+                ended_at__isnull=True,
+                target_amount__gt=0,
+            ).annotate(
+                **get_shard_counter_annotations()
+            ).annotate(
+                score=get_progress_expression(get_combined_amount_expression())
+            ).order_by('-score', '-id')
+        )
+
+    @swagger_auto_schema(
+        query_serializer=LeaderboardQuerySerializer,
+        responses={200: DonorRankSerializer(many=True)}
+    )
+    @action(detail=True, methods=['get'], url_path='top-donors')
+    def top_donors(self, request, pk=None):
+        """
+        Donors who paid the most into the collection.
+        Ranking is read from Redis, users by primary key.
+        """
+        collect = self.get_object()
+        limit = self.get_leaderboard_limit()
+        scores = read_leaderboard(get_donors_leaderboard_key(collect.id), limit)
+        if scores is None:
+            scores = list(collect.payments.filter(user__isnull=False).order_by(
+            ).values('user').annotate(
+                amount=Sum('amount')
+            ).order_by('-amount', 'user').values_list('user', 'amount')[:limit])
+        users = User.objects.in_bulk([user_id for user_id, _ in scores])
+        donors = [
+            {'user': users[user_id], 'amount': amount}
+            for user_id, amount in scores
+            if user_id in users
+        ]
+        return Response(DonorRankSerializer(donors, many=True).data)
 
     @swagger_auto_schema(
         request_body=openapi.Schema(
@@ -167,7 +689,16 @@ class CollectViewSet(viewsets.ModelViewSet):
                                          description='Amount')
             },
             required=['amount']
-        )
+        ),
+        manual_parameters=[
+            openapi.Parameter(
+                IDEMPOTENCY_HEADER,
+                openapi.IN_HEADER,
+                description='Retries with the same key return the first '
+                            'response instead of a new payment',
+                type=openapi.TYPE_STRING
+            ),
+        ]
     )
     @action(
         detail=True,
@@ -178,23 +709,112 @@ class CollectViewSet(viewsets.ModelViewSet):
     def pay(self, request, pk=None):
         """
         New single payment.
+        Request with Idempotency-Key header is made once per user and key:
+        retries get the stored first response, no new payment.
         """
-        collect = self.get_object()
-        amount = request.data.get('amount')
-        try:
-            amount = float(amount)
-            if amount < 0:
-                raise ValueError
-        except (ValueError, TypeError):
+        amount = self.get_payment_amount(request)
+        if amount is None:
             return Response(
                 {"err": "Amount must be a positive integer"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        payment = collect.add_payment(request.user, amount)
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return self.create_payment(request, amount)
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {"err": f"{IDEMPOTENCY_HEADER} must be 1 to "
+                        f"{IDEMPOTENCY_KEY_MAX_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        user_id = request.user.pk
+        # validated amount: "5", 5 and "5.00" are the same payment
+        fingerprint = get_request_fingerprint(pk, amount)
+        stored = get_stored_response(user_id, key)
+        if stored is not None:
+            return self.replay_payment(stored, fingerprint)
+        if not lock_key(user_id, key):
+            return Response(
+                {"err": f"Request with this {IDEMPOTENCY_HEADER} is in progress"},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            # stored while waiting for the lock
+            stored = get_stored_response(user_id, key)
+            if stored is not None:
+                return self.replay_payment(stored, fingerprint)
+            response = self.create_payment(request, amount, key)
+            if response.status_code == status.HTTP_201_CREATED:
+                store_response(
+                    user_id, key, fingerprint,
+                    response.status_code, response.data
+                )
+            return response
+        finally:
+            unlock_key(user_id, key)
+
+    @staticmethod
+    def replay_payment(stored, fingerprint):
+        """
+        Stored response of the pay request, error if the key was used
+        for another payment.
+        """
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"err": f"{IDEMPOTENCY_HEADER} was used for another payment"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        response = Response(stored["data"], status=stored["status"])
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    @staticmethod
+    def get_payment_amount(request):
+        """
+        Amount of the pay request rounded to cents as stored, None if it
+        is not a non-negative number.
+        """
+        try:
+            amount = Decimal(str(request.data.get('amount'))).quantize(
+                Decimal('0.01')
+            )
+            if amount < 0:
+                return None
+        except InvalidOperation:
+            return None
+        return amount
+
+    def create_payment(self, request, amount, idempotency_key=None):
+        collect = self.get_object()
+        try:
+            payment = collect.add_payment(
+                request.user, amount, idempotency_key=idempotency_key
+            )
+        except IntegrityError:
+            if idempotency_key is None:
+                raise
+            # stored response expired or evicted: payment with the key
+            # is in DB already
+            with pin_primary():
+                payment = Payment.objects.select_related('user').get(
+                    user=request.user, idempotency_key=idempotency_key
+                )
+            if (payment.collect_id, payment.amount) != (collect.pk, amount):
+                return Response(
+                    {"err": f"{IDEMPOTENCY_HEADER} was used for another payment"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+            return Response(
+                PaymentSerializer(payment).data, status=status.HTTP_201_CREATED
+            )
         serializer = PaymentSerializer(payment)
 
-        cache.delete(COLLECT_LIST_CACHE_KEY)
-        cache.delete(get_collect_feed_cache_key(collect.id))
+        bump_generation(COLLECT_LIST_NAMESPACE)
+        bump_generation(PAYMENT_LIST_NAMESPACE)
+        push_feed_cache(collect.id, serializer.data)
+        # version was bumped on commit, before the push: feed read
+        # in between must not keep it
+        bump_collect_version(collect.id)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -206,14 +826,84 @@ class PaymentViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Payment.objects.select_related('user').all()
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = PaymentCursorPagination
 
     def list(self, request, *args, **kwargs):
-        cached_data = cache.get("payment_list")
+        cache_key = get_query_cache_key(PAYMENT_LIST_NAMESPACE, request)
+        cached_data = cache_get(cache_key)
         if cached_data is not None:
             return Response(cached_data)
 
-        response = super().list(request, *args, **kwargs)
-        cache.set("payment_list",
-                  response.data,
-                  timeout=CACHE_LIFETIME_PERIOD_SEC)
+        with pin_primary():
+            response = super().list(request, *args, **kwargs)
+        cache_set(cache_key, response.data)
         return response
+
+    @swagger_auto_schema(
+        request_body=BulkPaymentSerializer,
+        responses={201: PaymentSerializer(many=True)}
+    )
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='bulk',
+        permission_classes=[IsAuthenticated]
+        )
+    def bulk(self, request):
+        """
+        Many payments at once (payroll, corporate matching etc.).
+        All payments are validated and saved together: one transaction,
+        one UPDATE and one cache invalidation per affected collect.
+        """
+        serializer = BulkPaymentSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        payments = Collect.add_payments(
+            request.user, serializer.validated_data['payments']
+        )
+
+        bump_generation(COLLECT_LIST_NAMESPACE)
+        bump_generation(PAYMENT_LIST_NAMESPACE)
+        collect_ids = {payment.collect_id for payment in payments}
+        drop_feed_cache(collect_ids)
+        # version was bumped on commit, before the drop: feed read
+        # in between must not keep it
+        for collect_id in collect_ids:
+            bump_collect_version(collect_id)
+
+        return Response(
+            PaymentSerializer(payments, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+async def collect_stream(request, pk):
+    """
+    Real-time collect stream (Server-Sent Events): current counters,
+    then new payments with fresh counters as they are committed.
+    Clients wait on asyncio queues, so it is served by ASGI server
+    only (`core.asgi`), WSGI worker would be blocked by every client.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"err": "Stream is served by ASGI server only"},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    try:
+        collect = await Collect.objects.annotate(
+            **get_shard_counter_annotations()
+        ).only(
+            'target_amount', 'current_amount', 'participants', 'ended_at'
+        ).aget(pk=pk)
+    except Collect.DoesNotExist:
+        raise Http404
+    collect.current_amount, collect.participants = (
+        collect.get_combined_counters()
+    )
+    response = StreamingHttpResponse(
+        collect_events(collect),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # nginx: do not buffer events
+    response['X-Accel-Buffering'] = 'no'
+    return response